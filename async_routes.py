@@ -0,0 +1,170 @@
+# 异步模式（ASYNC_DB=true）下的读接口，替换 main.py 中同路径的同步实现
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+from schemas import CommentsListResponse, LikeCountResponse, FollowingListResponse, FollowersListResponse, \
+    PagedPostResponse
+from config import settings
+from utils import async_crud
+from utils.async_database import get_async_db
+from utils.fast_json import fast_columns, list_body, list_response, dumps, POST_FIELDS, POST_COLUMNS, \
+    COMMENT_FIELDS, COMMENT_COLUMNS, USER_FIELDS, USER_COLUMNS
+from utils.catalog_cache import cached_json_response
+from utils.auth import Principal, decode_token, load_principal, oauth2_scheme, principal_cache
+from utils.pagination import parse_cursor, paginate, paginate_posts
+from utils.query_budget import query_budget
+from utils.response_cache import response_cache
+
+router = APIRouter()
+
+
+async def get_current_user(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)):
+    phone_number, user_id = decode_token(token)
+    principal = principal_cache.get(phone_number)
+    if principal is not None:
+        return principal
+    return await db.run_sync(load_principal, phone_number, user_id)
+
+
+@router.get("/post/{post_id}/comments", response_model=CommentsListResponse)
+@query_budget(2)
+async def get_post_comments(request: Request, post_id: int, page_size: int = Query(50, ge=1, le=100),
+                            cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    # 异步会话总是读主库，结果可以直接写入响应缓存；以后接入只读副本时要像同步接口一样只缓存主库的结果
+    key = response_cache.key("comments", post_id, page_size, cursor)
+    cached = response_cache.get(key)
+    if cached is None:
+        if not await async_crud.get_post_by_id(db, post_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found",
+            )
+        comments = await async_crud.get_comments_by_post_id(db, post_id, limit=page_size + 1,
+                                                            cursor=parse_cursor(cursor, datetime, int),
+                                                            columns=fast_columns(COMMENT_COLUMNS))
+        comments, next_cursor = paginate(comments, page_size, key=lambda c: (c.created_at, c.id))
+        cached = response_cache.set(key, list_body({"comments": comments, "next_cursor": next_cursor}, "comments",
+                                                   COMMENT_FIELDS, CommentsListResponse))
+    return cached_json_response(request, *cached, cache=response_cache)
+
+
+@router.get("/post/{post_id}/likes", response_model=LikeCountResponse)
+@query_budget(1)
+async def get_post_likes(request: Request, post_id: int, db: AsyncSession = Depends(get_async_db)):
+    # 同 get_post_comments，异步会话读主库，结果直接缓存
+    key = response_cache.key("likes", post_id)
+    cached = response_cache.get(key)
+    if cached is None:
+        like_count = await async_crud.get_like_count_by_post_id(db, post_id)
+        if like_count is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found",
+            )
+        cached = response_cache.set(key, dumps({"count": like_count}))
+    return cached_json_response(request, *cached, cache=response_cache)
+
+
+@router.get("/me/following", response_model=FollowingListResponse)
+@query_budget(3)
+async def get_following(page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                        current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """获取当前用户关注的人"""
+    rows = await async_crud.get_following_users(db, current_user.id, limit=page_size + 1,
+                                                cursor=parse_cursor(cursor, int), columns=fast_columns(USER_COLUMNS))
+    rows, next_cursor = paginate(rows, page_size, key=lambda row: (row[0],))
+    following_count, _ = await async_crud.get_follow_counts(db, current_user.id)
+    users = rows if settings.FAST_JSON else [user for _, user in rows]
+    return list_response({"following": users, "count": following_count, "next_cursor": next_cursor},
+                         "following", USER_FIELDS)
+
+
+@router.get("/me/followers", response_model=FollowersListResponse)
+@query_budget(3)
+async def get_followers(page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                        current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """获取关注当前用户的人"""
+    rows = await async_crud.get_follower_users(db, current_user.id, limit=page_size + 1,
+                                              cursor=parse_cursor(cursor, int), columns=fast_columns(USER_COLUMNS))
+    rows, next_cursor = paginate(rows, page_size, key=lambda row: (row[0],))
+    _, follower_count = await async_crud.get_follow_counts(db, current_user.id)
+    users = rows if settings.FAST_JSON else [user for _, user in rows]
+    return list_response({"followers": users, "count": follower_count, "next_cursor": next_cursor},
+                         "followers", USER_FIELDS)
+
+
+@router.get("/me/posts", response_model=PagedPostResponse)
+@query_budget(3)
+async def get_my_posts(page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100),
+                       cursor: Optional[str] = None, include_total: bool = True, include_liked: bool = False,
+                       current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """获取当前用户的所有帖子并分页显示，传 cursor 时按游标翻页"""
+    skip = (page - 1) * page_size
+    total = await async_crud.get_user_post_count(db, current_user.id) if include_total else None
+    posts = await async_crud.get_user_posts(db, current_user.id, skip=skip, limit=page_size + 1,
+                                            cursor=parse_cursor(cursor, datetime, int),
+                                            columns=fast_columns(POST_COLUMNS))
+    posts, next_cursor = paginate_posts(posts, page_size)
+    liked = None
+    if include_liked:
+        liked = sorted(await async_crud.get_liked_post_ids(db, current_user.id, [post.id for post in posts]))
+    return list_response({"total": total, "posts": posts, "next_cursor": next_cursor, "liked_post_ids": liked},
+                         "posts", POST_FIELDS)
+
+
+@router.get("/me/following/posts", response_model=PagedPostResponse)
+@query_budget(5)
+async def get_following_posts(page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100),
+                              cursor: Optional[str] = None, include_total: bool = True, include_liked: bool = False,
+                              current_user: Principal = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_async_db)):
+    """获取当前用户的关注用户的所有帖子并分页显示，传 cursor 时按游标翻页"""
+    skip = (page - 1) * page_size
+    total = await async_crud.get_following_users_post_count(db, current_user.id) if include_total else None
+    posts = await async_crud.get_following_users_posts(db, current_user.id, skip=skip, limit=page_size + 1,
+                                                       cursor=parse_cursor(cursor, datetime, int),
+                                                       columns=fast_columns(POST_COLUMNS))
+    posts, next_cursor = paginate_posts(posts, page_size)
+    liked = None
+    if include_liked:
+        liked = sorted(await async_crud.get_liked_post_ids(db, current_user.id, [post.id for post in posts]))
+    return list_response({"total": total, "posts": posts, "next_cursor": next_cursor, "liked_post_ids": liked},
+                         "posts", POST_FIELDS)
+
+
+@router.get("/user/{following_id}/posts", response_model=PagedPostResponse)
+@query_budget(5)
+async def get_specific_user_posts(following_id: int, page: int = Query(1, ge=1),
+                                  page_size: int = Query(10, ge=1, le=100), cursor: Optional[str] = None,
+                                  include_total: bool = True, include_liked: bool = False,
+                                  current_user: Principal = Depends(get_current_user),
+                                  db: AsyncSession = Depends(get_async_db)):
+    """获取关注用户的某个用户的所有帖子并分页显示，传 cursor 时按游标翻页"""
+    skip = (page - 1) * page_size
+    posts = await async_crud.get_specific_following_user_posts(db, current_user.id, following_id, skip=skip,
+                                                               limit=page_size + 1,
+                                                               cursor=parse_cursor(cursor, datetime, int),
+                                                               columns=fast_columns(POST_COLUMNS))
+    if posts is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You are not following this user",
+        )
+    total = await async_crud.get_specific_following_user_post_count(
+        db, current_user.id, following_id) if include_total else None
+    posts, next_cursor = paginate_posts(posts, page_size)
+    liked = None
+    if include_liked:
+        liked = sorted(await async_crud.get_liked_post_ids(db, current_user.id, [post.id for post in posts]))
+    return list_response({"total": total, "posts": posts, "next_cursor": next_cursor, "liked_post_ids": liked},
+                         "posts", POST_FIELDS)
+
+
+def use_async_routes(app):
+    """用 router 中的异步实现替换 app 上同路径、同方法的同步路由"""
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    app.router.routes = [route for route in app.router.routes if not (
+        isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods))]
+    app.include_router(router)
@@ -12,12 +12,90 @@ class MysqlConfig:
 
 
 class Settings:
-    DATABASE_URL = "mysql+pymysql://%s:%s@%s:%s/%s" % (
+    # 可用 DATABASE_URL 覆盖，例如本地测试用 sqlite:///./fkemo.db
+    DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://%s:%s@%s:%s/%s" % (
         MysqlConfig.MYSQL_USER, MysqlConfig.MYSQL_PASSWORD, MysqlConfig.MYSQL_HOST, MysqlConfig.MYSQL_PORT,
-        MysqlConfig.MYSQL_DATABASE)
+        MysqlConfig.MYSQL_DATABASE))
+    # 连接池：pool_recycle 需小于 MySQL 的 wait_timeout，避免拿到已被服务端断开的连接
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # 秒
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # 秒
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # 只读副本，逗号分隔的多个 URL；本地可用两个 SQLite 文件模拟，例如 sqlite:///./replica.db
+    REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+    REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "5"))  # 秒
+    READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))  # 写入后该时间内的读请求走主库
+    # 异步模式：读接口改为 async def，走异步引擎（aiomysql / aiosqlite）
+    ASYNC_DB = os.getenv("ASYNC_DB", "false").lower() == "true"
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace(
+        "mysql+pymysql://", "mysql+aiomysql://").replace("sqlite://", "sqlite+aiosqlite://"))
+    # 列表接口直接从行元组组装响应并用 orjson 编码，跳过 response_model 校验
+    FAST_JSON = os.getenv("FAST_JSON", "false").lower() == "true"
+    # 启动时执行 bootstrap 而不是只检查结构版本，仅用于本地开发和一次性测试库
+    SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "false").lower() == "true"
+    # 性能埋点：/metrics（Prometheus 文本格式）和 Server-Timing 响应头
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.2"))  # 超过该耗时的语句记一条 warning 日志
+    SLOW_QUERY_LOG_LENGTH = int(os.getenv("SLOW_QUERY_LOG_LENGTH", "500"))  # 慢查询日志中语句的最大长度
+    # 查询预算（utils/query_budget.py）：off 关闭，log 记日志和指标，raise 抛异常（测试用）
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log").lower()
+    QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))  # 同一形状语句一次请求内执行这么多次视为 N+1
     SECRET_KEY = "fkemo"
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7   # 7 days
+    AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))  # 已认证用户缓存条数
+    AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # 秒
+
+    # 密码哈希：bcrypt 在独立进程池中执行，登录时按当前轮数自动重新哈希
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+    HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))  # 排队加执行中的任务上限，超过直接返回 503
+
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "100"))  # 批量接口单次最多处理的条数
+
+    CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", "1"))  # 秒，目录缓存检查版本号的间隔
+
+    # 帖子评论列表/点赞数的响应缓存（utils/response_cache.py），本进程写入时立即失效；
+    # 进程内缓存感知不到其他 worker 的写入，TTL 限制这种情况下的最长过期时间
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "5"))  # 秒，0 表示不过期
+
+    # 兴趣重合推荐（/me/discover）
+    DISCOVER_CATEGORY_WEIGHT = float(os.getenv("DISCOVER_CATEGORY_WEIGHT", "1.0"))
+    DISCOVER_FAN_TYPE_WEIGHT = float(os.getenv("DISCOVER_FAN_TYPE_WEIGHT", "1.0"))
+    DISCOVER_REFRESH_INTERVAL = float(os.getenv("DISCOVER_REFRESH_INTERVAL", "5"))  # 秒，增量拉取新注册用户的间隔
+    DISCOVER_REBUILD_INTERVAL = float(os.getenv("DISCOVER_REBUILD_INTERVAL", "3600"))  # 秒，全量重建（同步标签变化）的间隔
+
+    # 关注关系图索引（互关、回关、二度推荐）
+    FOLLOW_GRAPH_REFRESH_INTERVAL = float(os.getenv("FOLLOW_GRAPH_REFRESH_INTERVAL", "5"))  # 秒，拉取其他 worker 新关注的间隔
+    FOLLOW_GRAPH_REBUILD_INTERVAL = float(os.getenv("FOLLOW_GRAPH_REBUILD_INTERVAL", "3600"))  # 秒，全量重建（同步取关）的间隔
+    FOLLOW_GRAPH_COMPACT_THRESHOLD = int(os.getenv("FOLLOW_GRAPH_COMPACT_THRESHOLD", "100000"))  # 增量超过该数提前重建
+    FOLLOW_SUGGESTION_MAX_INTERMEDIATE = int(os.getenv("FOLLOW_SUGGESTION_MAX_INTERMEDIATE", "2000"))  # 二度推荐最多展开的关注数
+
+    # 帖子全文搜索的进程内倒排索引（/search/posts）
+    SEARCH_REFRESH_INTERVAL = float(os.getenv("SEARCH_REFRESH_INTERVAL", "5"))  # 秒，拉取其他 worker 新帖的间隔
+    SEARCH_REBUILD_INTERVAL = float(os.getenv("SEARCH_REBUILD_INTERVAL", "3600"))  # 秒，全量重建的间隔
+    SEARCH_COMPACT_THRESHOLD = int(os.getenv("SEARCH_COMPACT_THRESHOLD", "100000"))  # 增量帖子超过该数提前重建
+
+    # 热门帖子（/posts/hot）：点赞、评论按半衰期衰减累加
+    TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", str(6 * 3600)))  # 秒
+    TRENDING_LIKE_WEIGHT = float(os.getenv("TRENDING_LIKE_WEIGHT", "1"))
+    TRENDING_COMMENT_WEIGHT = float(os.getenv("TRENDING_COMMENT_WEIGHT", "3"))
+    TRENDING_TOP_K = int(os.getenv("TRENDING_TOP_K", "1000"))  # 进程内维护的前 K 名，/posts/hot 最多返回这么多
+    TRENDING_MIN_SCORE = float(os.getenv("TRENDING_MIN_SCORE", "0.05"))  # 衰减到该值以下的帖子不再跟踪
+    TRENDING_CHECKPOINT_INTERVAL = float(os.getenv("TRENDING_CHECKPOINT_INTERVAL", "60"))  # 秒，合并到 post_scores 的间隔
+
+    # 关注流收件箱（写扩散），关闭时 /me/following/posts 仍走读时聚合
+    TIMELINE_ENABLED = os.getenv("TIMELINE_ENABLED", "false").lower() == "true"
+    TIMELINE_CELEBRITY_THRESHOLD = int(os.getenv("TIMELINE_CELEBRITY_THRESHOLD", "10000"))  # 粉丝数超过该值不做写扩散
+    TIMELINE_BACKFILL_LIMIT = int(os.getenv("TIMELINE_BACKFILL_LIMIT", "200"))  # 新关注时回填的帖子数
+
+    # 点赞计数写缓冲
+    LIKE_FLUSH_INTERVAL = float(os.getenv("LIKE_FLUSH_INTERVAL", "1.0"))  # 秒
+    LIKE_FLUSH_THRESHOLD = int(os.getenv("LIKE_FLUSH_THRESHOLD", "1000"))  # 攒够多少次点赞立即刷新
 
 
 settings = Settings()
\ No newline at end of file
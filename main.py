@@ -1,15 +1,25 @@
-from typing import List
-from fastapi import FastAPI, Depends, HTTPException, status
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 import models
-from utils.database import engine, get_db
+from config import settings
+from utils.database import engine, SessionLocal, get_db, get_read_db, pool_monitors, replica_router, reads_primary, \
+    ReadYourWritesMiddleware
 from schemas import (
     UserCreate, PostCreate, CommentCreate, LikeCreate,
     UserResponse, PostResponse, CommentResponse, LikeResponse, FollowCreate,
-    FollowResponse, CommentsListResponse, LikeCountResponse, FollowingListResponse,
-    FollowersListResponse, FollowedUser, PagedPostResponse, InterestCategoryCreate,
-    InterestCategoryResponse, FanTypeCreate, FanTypeResponse
+    FollowResponse, CommentsListResponse, LikeCountResponse, FollowingListResponse, LikeBatchCreate,
+    CommentBatchCreate, FollowBatchCreate, BatchCreateResponse, LikeCountsResponse, UserListResponse,
+    FollowersListResponse, PagedPostResponse, InterestCategoryCreate,
+    InterestCategoryResponse, FanTypeCreate, FanTypeResponse, DiscoverResponse, SuggestionsResponse,
+    SearchPostsResponse, HotPostsResponse, LikedPostsResponse
 )
 from utils.crud import (
     create_user, create_post, create_comment, create_like, create_follow,
@@ -17,18 +27,113 @@ from utils.crud import (
     get_following_users, get_follower_users, get_user_posts, get_following_users_posts,
     get_user_post_count, get_following_users_post_count, get_specific_following_user_posts,
     get_specific_following_user_post_count, create_interest_category, get_all_interest_categories,
-    create_fan_type, get_all_fan_types
+    create_fan_type, get_all_fan_types, delete_follow, get_follow_counts, create_comments, create_likes,
+    create_follows, get_posts_by_ids, get_like_counts_by_post_ids, iter_comments_by_post_id,
+    get_users_by_interest_category, get_users_by_fan_type, get_following_ids, get_users_by_ids,
+    get_liked_post_ids
 )
-from utils.auth import authenticate_user, create_access_token, get_current_user
+from utils.auth import authenticate_user, create_access_token, get_current_user, principal_cache, Principal
+from utils.catalog_cache import catalog_cache, cached_json_response
+from utils.discover import discover_index
+from utils.fast_json import fast_columns, list_body, list_response, dumps, POST_FIELDS, POST_COLUMNS, \
+    COMMENT_FIELDS, COMMENT_COLUMNS, USER_FIELDS, USER_COLUMNS
+from utils.follow_graph import follow_graph
+from utils.hashing import hashing_pool, hash_password, HashingOverloaded
+from utils.like_buffer import like_buffer
+from utils.metrics import metrics, MetricsMiddleware
+from utils.response_cache import response_cache
+from utils.schema import bootstrap, check_schema
+from utils.search import search_index
+from utils.trending import trending
+from utils.query_budget import query_budget, violations as query_budget_violations
+from utils.pagination import parse_cursor, paginate, paginate_posts
+
+interest_categories_adapter = TypeAdapter(List[InterestCategoryResponse])
+fan_types_adapter = TypeAdapter(List[FanTypeResponse])
+
+
+def serialize_catalog(adapter: TypeAdapter, rows):
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 只读一行结构版本，DDL 由 scripts/migrate_schema.py 负责
+    if settings.SCHEMA_AUTO_MIGRATE:
+        bootstrap(engine)
+    else:
+        check_schema(engine)
+    hashing_pool.start()
+    like_buffer.start()
+    replica_router.start()
+    follow_graph.start()
+    search_index.start()
+    trending.start()
+    yield
+    replica_router.stop()
+    trending.stop()
+    like_buffer.stop()
+    hashing_pool.shutdown()
+    if settings.ASYNC_DB:
+        from utils.async_database import async_engine
+        await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
+# 最后添加的在最外层，耗时包含其他中间件
+app.add_middleware(MetricsMiddleware)
+
+# /stats/* 的内容同时以 Prometheus 指标输出到 /metrics
+metrics.register("like_buffer", like_buffer.stats)
+metrics.register("auth_cache", principal_cache.stats)
+metrics.register("hashing", hashing_pool.stats)
+metrics.register("db_pool", lambda: {name: monitor.stats() for name, monitor in pool_monitors.items()}, label="pool")
+metrics.register("replicas", replica_router.stats)
+metrics.register("catalog_cache", catalog_cache.stats)
+metrics.register("discover", discover_index.stats)
+metrics.register("follow_graph", follow_graph.stats)
+metrics.register("response_cache", response_cache.stats)
+metrics.register("search", search_index.stats)
+metrics.register("trending", trending.stats)
+metrics.register("query_budget_violations", query_budget_violations.stats, label="route")
+
+
+@app.exception_handler(HashingOverloaded)
+def hashing_overloaded_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def parse_ids(ids: str):
+    """解析逗号分隔的 id 列表，如 ids=1,2,3"""
+    try:
+        parsed = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid ids",
+        )
+    check_batch_size(parsed)
+    return parsed
 
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+def check_batch_size(items):
+    if len(items) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Too many items, at most %d per request" % settings.BATCH_MAX_SIZE,
+        )
 
 
 @app.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = create_user(db, user)
+@query_budget(6)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    hashed_password = await hashing_pool.run(hash_password, user.password)
+    db_user = await run_in_threadpool(create_user, db, user, hashed_password)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,26 +143,29 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/login", response_model=dict)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+@query_budget(2)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.phone_number})
+    access_token = create_access_token(data={"sub": user.phone_number, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @app.post("/post", response_model=PostResponse)
+@query_budget(5)
 def create_new_post(post: PostCreate, db: Session = Depends(get_db),
-                    current_user: models.User = Depends(get_current_user)):
+                    current_user: Principal = Depends(get_current_user)):
     db_post = create_post(db, post, current_user.id)
     return db_post
 
 
 @app.post("/comment", response_model=CommentResponse)
+@query_budget(3)
 def create_new_comment(comment: CommentCreate, post_id: int, db: Session = Depends(get_db)):
     if not get_post_by_id(db, post_id):
         raise HTTPException(
@@ -69,19 +177,23 @@ def create_new_comment(comment: CommentCreate, post_id: int, db: Session = Depen
 
 
 @app.post("/like", response_model=LikeResponse)
-def create_new_like(like: LikeCreate, db: Session = Depends(get_db)):
+@query_budget(4)
+def create_new_like(like: LikeCreate, current_user: Principal = Depends(get_current_user),
+                    db: Session = Depends(get_db)):
+    """点赞，重复点赞返回已有的记录"""
     if not get_post_by_id(db, like.post_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found",
         )
-    db_like = create_like(db, like.post_id)
+    db_like = create_like(db, like.post_id, current_user.id)
     return db_like
 
 
 @app.post("/follow", response_model=FollowResponse)
+@query_budget(7)
 def follow_user(follow: FollowCreate, db: Session = Depends(get_db),
-                current_user: models.User = Depends(get_current_user)):
+                current_user: Principal = Depends(get_current_user)):
     if not get_user_by_id(db, follow.following_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -96,93 +208,408 @@ def follow_user(follow: FollowCreate, db: Session = Depends(get_db),
     return db_follow
 
 
-@app.get("/post/{post_id}/comments", response_model=CommentsListResponse)
-def get_post_comments(post_id: int, db: Session = Depends(get_db)):
-    if not get_post_by_id(db, post_id):
+@app.delete("/follow/{following_id}", response_model=dict)
+@query_budget(5)
+def unfollow_user(following_id: int, db: Session = Depends(get_db),
+                  current_user: Principal = Depends(get_current_user)):
+    """取消关注"""
+    if not delete_follow(db, current_user.id, following_id):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You are not following this user",
         )
-    comments = get_comments_by_post_id(db, post_id)
-    return {"comments": comments}
+    return {"following_id": following_id}
+
+
+@app.post("/likes/batch", response_model=BatchCreateResponse)
+@query_budget(4)
+def create_new_likes(likes: LikeBatchCreate, current_user: Principal = Depends(get_current_user),
+                     db: Session = Depends(get_db)):
+    """批量点赞，已赞过的帖子计入 skipped"""
+    check_batch_size(likes.post_ids)
+    created, skipped = create_likes(db, current_user.id, likes.post_ids)
+    return {"created": created, "skipped": skipped}
+
+
+@app.post("/comments/batch", response_model=BatchCreateResponse)
+@query_budget(2)
+def create_new_comments(comments: CommentBatchCreate, db: Session = Depends(get_db)):
+    """批量评论"""
+    check_batch_size(comments.comments)
+    created, skipped = create_comments(db, comments.comments)
+    return {"created": created, "skipped": skipped}
+
+
+@app.post("/follows/batch", response_model=BatchCreateResponse)
+@query_budget(7)
+def follow_users(follows: FollowBatchCreate, db: Session = Depends(get_db),
+                 current_user: Principal = Depends(get_current_user)):
+    """批量关注（导入关注列表）"""
+    check_batch_size(follows.following_ids)
+    created, skipped = create_follows(db, current_user.id, follows.following_ids)
+    return {"created": created, "skipped": skipped}
+
+
+@app.get("/posts", response_model=List[PostResponse])
+@query_budget(1)
+def get_posts(ids: str, db: Session = Depends(get_read_db)):
+    """按 id 批量获取帖子，ids=1,2,3"""
+    return get_posts_by_ids(db, parse_ids(ids))
+
+
+@app.get("/me/liked", response_model=LikedPostsResponse)
+@query_budget(2)
+def get_my_liked(ids: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """ids=1,2,3 中当前用户赞过的帖子，用于列表页显示「已赞」"""
+    post_ids = parse_ids(ids)
+    return {"post_ids": sorted(get_liked_post_ids(db, current_user.id, post_ids))}
+
+
+@app.get("/posts/hot", response_model=HotPostsResponse)
+@query_budget(1)
+def get_hot_posts(limit: int = 20, db: Session = Depends(get_read_db)):
+    """热门帖子：点赞、评论按时间衰减后的热度排序，包含其他 worker 最近一次检查点之前的数据"""
+    scored = trending.top(max(1, min(limit, settings.TRENDING_TOP_K)))
+    posts = {post.id: post for post in get_posts_by_ids(db, [post_id for post_id, _ in scored])}
+    return {"posts": [{"post": posts[post_id], "score": score} for post_id, score in scored if post_id in posts]}
+
+
+@app.get("/search/posts", response_model=SearchPostsResponse)
+@query_budget(3)
+def search_posts(q: str, page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                 db: Session = Depends(get_read_db)):
+    """按内容全文搜索帖子，多个词须同时出现；按相关度降序，同分时新帖在前
+
+    cursor 为 (score, id) 加上首页的语料统计，后续页按同一份统计打分，翻页期间的新帖不会打乱分页
+    """
+    search_index.refresh(db)
+    values = parse_cursor(cursor, float, int, int, int, float, str)
+    after = corpus = None
+    try:
+        if values:
+            # 游标为 (score, id, 最大帖子 id, 文档数, 平均长度, "各词文档频率")
+            after = values[:2]
+            corpus = values[2:5] + (tuple(int(frequency) for frequency in values[5].split(",")),)
+        hits, corpus = search_index.search(q, page_size + 1, after, corpus)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    frequencies = ",".join(map(str, corpus[3])) if corpus else ""
+    hits, next_cursor = paginate(hits, page_size, key=lambda hit: hit + corpus[:3] + (frequencies,))
+    return {"posts": get_posts_by_ids(db, [post_id for _, post_id in hits]), "next_cursor": next_cursor}
 
 
-@app.get("/post/{post_id}/likes", response_model=LikeCountResponse)
-def get_post_likes(post_id: int, db: Session = Depends(get_db)):
+@app.get("/posts/likes", response_model=LikeCountsResponse)
+@query_budget(1)
+def get_posts_likes(ids: str, db: Session = Depends(get_read_db)):
+    """批量获取帖子点赞数，ids=1,2,3，不存在的帖子不返回"""
+    return {"counts": get_like_counts_by_post_ids(db, parse_ids(ids))}
+
+
+@app.get("/post/{post_id}/comments", response_model=CommentsListResponse)
+@query_budget(2)
+def get_post_comments(request: Request, post_id: int, page_size: int = Query(50, ge=1, le=100),
+                      cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """获取帖子评论，按时间正序分页，传 cursor 时按游标翻页；响应按帖子缓存（只缓存读主库的结果），带 ETag"""
+    key = response_cache.key("comments", post_id, page_size, cursor)
+    cached = response_cache.get(key)
+    if cached is None:
+        if not get_post_by_id(db, post_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found",
+            )
+        comments = get_comments_by_post_id(db, post_id, limit=page_size + 1,
+                                           cursor=parse_cursor(cursor, datetime, int),
+                                           columns=fast_columns(COMMENT_COLUMNS))
+        comments, next_cursor = paginate(comments, page_size, key=lambda c: (c.created_at, c.id))
+        cached = response_cache.set(key, list_body({"comments": comments, "next_cursor": next_cursor}, "comments",
+                                                   COMMENT_FIELDS, CommentsListResponse), store=reads_primary(db))
+    return cached_json_response(request, *cached, cache=response_cache)
+
+
+@app.get("/post/{post_id}/comments/stream")
+@query_budget(2)
+def stream_post_comments(post_id: int, db: Session = Depends(get_read_db)):
+    """以 NDJSON 流式返回帖子的全部评论，内存占用与评论数无关"""
     if not get_post_by_id(db, post_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found",
         )
-    like_count = get_like_count_by_post_id(db, post_id)
-    return {"count": like_count}
+    # 依赖注入的会话在响应开始前就会关闭，流式读取使用单独的会话
+    bind = db.get_bind()
+
+    def generate():
+        stream_db = SessionLocal(bind=bind)
+        try:
+            for rows in iter_comments_by_post_id(stream_db, post_id):
+                yield "".join(json.dumps({
+                    "id": row.id, "content": row.content, "post_id": row.post_id, "nickname": row.nickname,
+                    "created_at": row.created_at.isoformat(), "updated_at": row.updated_at.isoformat(),
+                }, ensure_ascii=False) + "\n" for row in rows)
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/post/{post_id}/likes", response_model=LikeCountResponse)
+@query_budget(1)
+def get_post_likes(request: Request, post_id: int, db: Session = Depends(get_read_db)):
+    key = response_cache.key("likes", post_id)
+    cached = response_cache.get(key)
+    if cached is None:
+        like_count = get_like_count_by_post_id(db, post_id)
+        if like_count is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found",
+            )
+        cached = response_cache.set(key, dumps({"count": like_count}), store=reads_primary(db))
+    return cached_json_response(request, *cached, cache=response_cache)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 文本格式的请求延迟、查询统计和各组件指标"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/like_buffer", response_model=dict)
+def get_like_buffer_stats():
+    """点赞计数写缓冲的积压与刷新延迟"""
+    return like_buffer.stats()
 
 
 @app.get("/me/following", response_model=FollowingListResponse)
-def get_following(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@query_budget(3)
+def get_following(page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                  current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """获取当前用户关注的人"""
-    followed = get_following_users(db, current_user.id)
-    result = []
-    for f in followed:
-        user = get_user_by_id(db, f.following_id)
-        result.append(FollowedUser(**vars(user)))
-    return {"following": result, "count": len(result)}
+    rows = get_following_users(db, current_user.id, limit=page_size + 1, cursor=parse_cursor(cursor, int),
+                               columns=fast_columns(USER_COLUMNS))
+    rows, next_cursor = paginate(rows, page_size, key=lambda row: (row[0],))
+    following_count, _ = get_follow_counts(db, current_user.id)
+    users = rows if settings.FAST_JSON else [user for _, user in rows]
+    return list_response({"following": users, "count": following_count, "next_cursor": next_cursor},
+                         "following", USER_FIELDS)
 
 
 @app.get("/me/followers", response_model=FollowersListResponse)
-def get_followers(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@query_budget(3)
+def get_followers(page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                  current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """获取关注当前用户的人"""
-    followers = get_follower_users(db, current_user.id)
-    result = []
-    for f in followers:
-        user = get_user_by_id(db, f.follower_id)
-        result.append(FollowedUser(**vars(user)))
-    return {"followers": result, "count": len(result)}
+    rows = get_follower_users(db, current_user.id, limit=page_size + 1, cursor=parse_cursor(cursor, int),
+                              columns=fast_columns(USER_COLUMNS))
+    rows, next_cursor = paginate(rows, page_size, key=lambda row: (row[0],))
+    _, follower_count = get_follow_counts(db, current_user.id)
+    users = rows if settings.FAST_JSON else [user for _, user in rows]
+    return list_response({"followers": users, "count": follower_count, "next_cursor": next_cursor},
+                         "followers", USER_FIELDS)
+
+
+@app.get("/me/discover", response_model=DiscoverResponse)
+@query_budget(6)
+def discover_users(limit: int = 20, current_user: Principal = Depends(get_current_user),
+                   db: Session = Depends(get_read_db)):
+    """按兴趣类别/粉丝类型重合度推荐尚未关注的用户"""
+    limit = max(1, min(limit, 100))
+    discover_index.refresh(db)
+    scored = discover_index.top_k(current_user.id, get_following_ids(db, current_user.id), limit)
+    users = get_users_by_ids(db, [user_id for user_id, _ in scored])
+    scores = dict(scored)
+    return {"users": [{"user": user, "score": scores[user.id]} for user in users]}
+
+
+def page_user_ids(db: Session, user_ids, page_size: int, cursor: Optional[str]):
+    """对按 id 升序的用户 id 数组游标翻页，cursor 为 (user_id,)"""
+    cursor = parse_cursor(cursor, int)
+    start = int(user_ids.searchsorted(cursor[0], side="right")) if cursor is not None else 0
+    users = get_users_by_ids(db, user_ids[start:start + page_size + 1].tolist())
+    users, next_cursor = paginate(users, page_size, key=lambda u: (u.id,))
+    return {"users": users, "next_cursor": next_cursor}
+
+
+@app.get("/me/mutuals", response_model=UserListResponse)
+@query_budget(3)
+def get_mutuals(page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """与当前用户互相关注的人"""
+    follow_graph.refresh(db)
+    return page_user_ids(db, follow_graph.mutuals(current_user.id), page_size, cursor)
+
+
+@app.get("/me/follow_backs", response_model=UserListResponse)
+@query_budget(3)
+def get_follow_backs(page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                     current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """关注了当前用户、但当前用户还没有回关的人"""
+    follow_graph.refresh(db)
+    return page_user_ids(db, follow_graph.follow_backs(current_user.id), page_size, cursor)
+
+
+@app.get("/user/{user_id}/followed_by", response_model=UserListResponse)
+@query_budget(3)
+def get_followed_by_following(user_id: int, page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                              current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """当前用户关注的人中，也关注了该用户的人"""
+    follow_graph.refresh(db)
+    return page_user_ids(db, follow_graph.followed_by_following(current_user.id, user_id), page_size, cursor)
+
+
+@app.get("/me/suggestions", response_model=SuggestionsResponse)
+@query_budget(3)
+def get_follow_suggestions(limit: int = 20, current_user: Principal = Depends(get_current_user),
+                           db: Session = Depends(get_read_db)):
+    """二度关注推荐：按「我关注的人中有多少人关注了他」排序"""
+    follow_graph.refresh(db)
+    scored = follow_graph.suggestions(current_user.id, max(1, min(limit, 100)),
+                                      settings.FOLLOW_SUGGESTION_MAX_INTERMEDIATE)
+    users = get_users_by_ids(db, [user_id for user_id, _ in scored])
+    path_counts = dict(scored)
+    return {"users": [{"user": user, "path_count": path_counts[user.id]} for user in users]}
+
+
+@app.get("/stats/follow_graph", response_model=dict)
+def get_follow_graph_stats():
+    """关注关系图索引的边数与内存占用"""
+    return follow_graph.stats()
+
+
+@app.get("/stats/trending", response_model=dict)
+def get_trending_stats():
+    """热度索引跟踪的帖子数与检查点情况"""
+    return trending.stats()
+
+
+@app.get("/stats/search", response_model=dict)
+def get_search_stats():
+    """全文搜索索引的帖子数、词数与内存占用"""
+    return search_index.stats()
+
+
+@app.get("/stats/discover", response_model=dict)
+def get_discover_stats():
+    """推荐索引的用户数与内存占用"""
+    return discover_index.stats()
+
+
+@app.get("/stats/db_pool", response_model=dict)
+def get_db_pool_stats():
+    """数据库连接池使用情况与取连接等待时间分布"""
+    return {name: monitor.stats() for name, monitor in pool_monitors.items()}
+
+
+@app.get("/stats/replicas", response_model=dict)
+def get_replica_stats():
+    """只读副本健康状态与读请求分布"""
+    return replica_router.stats()
+
+
+@app.get("/stats/hashing", response_model=dict)
+def get_hashing_stats():
+    """密码哈希进程池的排队情况"""
+    return hashing_pool.stats()
+
+
+@app.get("/stats/response_cache", response_model=dict)
+def get_response_cache_stats():
+    """帖子评论/点赞数响应缓存的命中率、占用和淘汰次数"""
+    return response_cache.stats()
+
+
+@app.get("/stats/auth_cache", response_model=dict)
+def get_auth_cache_stats():
+    """已认证用户缓存的命中情况"""
+    return principal_cache.stats()
 
 
 @app.get("/me/posts", response_model=PagedPostResponse)
-def get_my_posts(page: int = 1, page_size: int = 10, current_user: models.User = Depends(get_current_user),
-                 db: Session = Depends(get_db)):
-    """获取当前用户的所有帖子并分页显示"""
+@query_budget(3)
+def get_my_posts(page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100), cursor: Optional[str] = None,
+                 include_total: bool = True, include_liked: bool = False,
+                 current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """获取当前用户的所有帖子并分页显示，传 cursor 时按游标翻页"""
     skip = (page - 1) * page_size
-    total = get_user_post_count(db, current_user.id)
-    posts = get_user_posts(db, current_user.id, skip=skip, limit=page_size)
-    return {"total": total, "posts": posts}
+    total = get_user_post_count(db, current_user.id) if include_total else None
+    posts = get_user_posts(db, current_user.id, skip=skip, limit=page_size + 1,
+                           cursor=parse_cursor(cursor, datetime, int), columns=fast_columns(POST_COLUMNS))
+    posts, next_cursor = paginate_posts(posts, page_size)
+    liked = None
+    if include_liked:
+        liked = sorted(get_liked_post_ids(db, current_user.id, [post.id for post in posts]))
+    return list_response({"total": total, "posts": posts, "next_cursor": next_cursor, "liked_post_ids": liked},
+                         "posts", POST_FIELDS)
 
 
 @app.get("/me/following/posts", response_model=PagedPostResponse)
-def get_following_posts(page: int = 1, page_size: int = 10, current_user: models.User = Depends(get_current_user),
-                        db: Session = Depends(get_db)):
-    """获取当前用户的关注用户的所有帖子并分页显示"""
+@query_budget(5)
+def get_following_posts(page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100),
+                        cursor: Optional[str] = None, include_total: bool = True, include_liked: bool = False,
+                        current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """获取当前用户的关注用户的所有帖子并分页显示，传 cursor 时按游标翻页"""
     skip = (page - 1) * page_size
-    total = get_following_users_post_count(db, current_user.id)
-    posts = get_following_users_posts(db, current_user.id, skip=skip, limit=page_size)
-    return {"total": total, "posts": posts}
+    total = get_following_users_post_count(db, current_user.id) if include_total else None
+    posts = get_following_users_posts(db, current_user.id, skip=skip, limit=page_size + 1,
+                                      cursor=parse_cursor(cursor, datetime, int), columns=fast_columns(POST_COLUMNS))
+    posts, next_cursor = paginate_posts(posts, page_size)
+    liked = None
+    if include_liked:
+        liked = sorted(get_liked_post_ids(db, current_user.id, [post.id for post in posts]))
+    return list_response({"total": total, "posts": posts, "next_cursor": next_cursor, "liked_post_ids": liked},
+                         "posts", POST_FIELDS)
 
 
 @app.get("/user/{following_id}/posts", response_model=PagedPostResponse)
-def get_specific_user_posts(following_id: int, page: int = 1, page_size: int = 10,
-                            current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """获取关注用户的某个用户的所有帖子并分页显示"""
+@query_budget(5)
+def get_specific_user_posts(following_id: int, page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100),
+                            cursor: Optional[str] = None, include_total: bool = True, include_liked: bool = False,
+                            current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """获取关注用户的某个用户的所有帖子并分页显示，传 cursor 时按游标翻页"""
     skip = (page - 1) * page_size
-    total = get_specific_following_user_post_count(db, current_user.id, following_id)
-    if total is None:
+    posts = get_specific_following_user_posts(db, current_user.id, following_id, skip=skip, limit=page_size + 1,
+                                              cursor=parse_cursor(cursor, datetime, int),
+                                              columns=fast_columns(POST_COLUMNS))
+    if posts is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You are not following this user",
         )
-    posts = get_specific_following_user_posts(db, current_user.id, following_id, skip=skip, limit=page_size)
-    return {"total": total, "posts": posts}
+    total = get_specific_following_user_post_count(db, current_user.id, following_id) if include_total else None
+    posts, next_cursor = paginate_posts(posts, page_size)
+    liked = None
+    if include_liked:
+        liked = sorted(get_liked_post_ids(db, current_user.id, [post.id for post in posts]))
+    return list_response({"total": total, "posts": posts, "next_cursor": next_cursor, "liked_post_ids": liked},
+                         "posts", POST_FIELDS)
 
 
 @app.get("/interest_categories", response_model=List[InterestCategoryResponse])
-def get_interest_categories(db: Session = Depends(get_db)):
-    """获取所有兴趣类别"""
-    categories = get_all_interest_categories(db)
-    return categories
+@query_budget(2)
+def get_interest_categories(request: Request, db: Session = Depends(get_read_db)):
+    """获取所有兴趣类别，支持 If-None-Match"""
+    body, etag = catalog_cache.get(db, "interest_categories", lambda db: serialize_catalog(
+        interest_categories_adapter, get_all_interest_categories(db)))
+    return cached_json_response(request, body, etag)
+
+
+@app.get("/interest_categories/{category_id}/users", response_model=UserListResponse)
+@query_budget(2)
+def get_interest_category_users(category_id: int, page_size: int = Query(20, ge=1, le=100),
+                                cursor: Optional[str] = None, current_user: Principal = Depends(get_current_user),
+                                db: Session = Depends(get_read_db)):
+    """获取有某个兴趣类别的用户，按用户 id 游标翻页"""
+    users = get_users_by_interest_category(db, category_id, limit=page_size + 1, cursor=parse_cursor(cursor, int))
+    users, next_cursor = paginate(users, page_size, key=lambda u: (u.id,))
+    return {"users": users, "next_cursor": next_cursor}
 
 
 @app.post("/interest_categories", response_model=InterestCategoryResponse)
+@query_budget(4)
 def create_interest_categories(category: InterestCategoryCreate, db: Session = Depends(get_db)):
     """创建新的兴趣类别"""
     db_category = create_interest_category(db, category)
@@ -190,19 +617,44 @@ def create_interest_categories(category: InterestCategoryCreate, db: Session = D
 
 
 @app.get("/fan_types", response_model=List[FanTypeResponse])
-def get_fan_types(db: Session = Depends(get_db)):
-    """获取所有粉丝类型"""
-    fan_types = get_all_fan_types(db)
-    return fan_types
+@query_budget(2)
+def get_fan_types(request: Request, db: Session = Depends(get_read_db)):
+    """获取所有粉丝类型，支持 If-None-Match"""
+    body, etag = catalog_cache.get(db, "fan_types", lambda db: serialize_catalog(
+        fan_types_adapter, get_all_fan_types(db)))
+    return cached_json_response(request, body, etag)
+
+
+@app.get("/stats/catalog_cache", response_model=dict)
+def get_catalog_cache_stats():
+    """目录缓存命中情况"""
+    return catalog_cache.stats()
+
+
+@app.get("/fan_types/{fan_type_id}/users", response_model=UserListResponse)
+@query_budget(2)
+def get_fan_type_users(fan_type_id: int, page_size: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                       current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """获取属于某个粉丝类型的用户，按用户 id 游标翻页"""
+    users = get_users_by_fan_type(db, fan_type_id, limit=page_size + 1, cursor=parse_cursor(cursor, int))
+    users, next_cursor = paginate(users, page_size, key=lambda u: (u.id,))
+    return {"users": users, "next_cursor": next_cursor}
 
 
 @app.post("/fan_types", response_model=FanTypeResponse)
+@query_budget(4)
 def create_fan_types(fan_type: FanTypeCreate, db: Session = Depends(get_db)):
     """创建新的粉丝类型"""
     db_fan_type = create_fan_type(db, fan_type)
     return db_fan_type
 
 
+if settings.ASYNC_DB:
+    # 异步模式：读接口换成 async_routes 中的 async def 实现，需放在所有路由定义之后
+    from async_routes import use_async_routes
+    use_async_routes(app)
+
+
 if __name__ == '__main__':
     import uvicorn
 
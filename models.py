@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Boolean, UniqueConstraint, Index, \
+    text
 from sqlalchemy.orm import relationship
 from utils.database import Base
 from datetime import datetime
@@ -15,6 +16,10 @@ class User(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     interest_categories = Column(String(256), default='')  # 使用逗号分隔的字符串来存储多个类别
     fan_types = Column(String(256), default='')  # 使用逗号分隔的字符串来存储多个类别
+    follower_count = Column(Integer, default=0)  # 粉丝数，随关注/取关维护
+    following_count = Column(Integer, default=0)  # 关注数，随关注/取关维护
+    # 有帖子因大V 没写扩散过；之后粉丝数降下来也保持，关注流一直读时合并他的帖子，否则那些帖子会从关注流消失
+    timeline_pull = Column(Boolean, default=False, server_default=text("0"))
     followers = relationship("Follow", back_populates="follower", foreign_keys="Follow.follower_id")
     following = relationship("Follow", back_populates="following", foreign_keys="Follow.following_id")
 
@@ -26,9 +31,12 @@ class Post(Base):
     content = Column(Text)
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User")
+    like_count = Column(Integer, default=0)  # 冗余点赞数，由点赞写缓冲批量更新
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (Index('ix_posts_user_created', 'user_id', 'created_at', 'id'),)
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -40,15 +48,24 @@ class Comment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (Index('ix_comments_post_created', 'post_id', 'created_at', 'id'),)
+
 
 class Like(Base):
     __tablename__ = "likes"
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
+    user_id = Column(Integer, ForeignKey("users.id"))  # 匿名点赞时期的旧数据为空
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index('ix_likes_post_id', 'post_id'),  # 按帖子重算点赞数
+        # 每人每帖只能赞一次；user_id 在前，同时用于查「当前用户赞过这些帖子中的哪些」
+        Index('ux_likes_user_post', 'user_id', 'post_id', unique=True),
+    )
+
 
 class Follow(Base):
     __tablename__ = "follows"
@@ -61,7 +78,48 @@ class Follow(Base):
     follower = relationship("User", foreign_keys=[follower_id], back_populates="followers")
     following = relationship("User", foreign_keys=[following_id], back_populates="following")
 
-    __table_args__ = (UniqueConstraint('follower_id', 'following_id', name='_follower_following_uc'),)
+    __table_args__ = (
+        UniqueConstraint('follower_id', 'following_id', name='_follower_following_uc'),
+        Index('ix_follows_follower_id', 'follower_id', 'id'),
+        Index('ix_follows_following_id', 'following_id', 'id'),
+    )
+
+
+class UserInterestCategory(Base):
+    """用户与兴趣类别的关联，主键支持按用户查类别，反向索引支持按类别查用户"""
+    __tablename__ = "user_interest_categories"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category_id = Column(Integer, ForeignKey("interest_categories.id"), primary_key=True)
+
+    __table_args__ = (Index('ix_user_interest_categories_category', 'category_id', 'user_id'),)
+
+
+class UserFanType(Base):
+    """用户与粉丝类型的关联"""
+    __tablename__ = "user_fan_types"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    fan_type_id = Column(Integer, ForeignKey("fan_types.id"), primary_key=True)
+
+    __table_args__ = (Index('ix_user_fan_types_fan_type', 'fan_type_id', 'user_id'),)
+
+
+class TimelineEntry(Base):
+    """关注流收件箱：发帖时把帖子写入每个粉丝的收件箱"""
+    __tablename__ = "timeline"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))  # 收件箱所属用户（粉丝）
+    post_id = Column(Integer, ForeignKey("posts.id"))
+    author_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime)  # 冗余帖子的发布时间，按索引顺序读取
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'post_id', name='_timeline_user_post_uc'),
+        Index('ix_timeline_user_created', 'user_id', 'created_at', 'post_id'),
+        Index('ix_timeline_user_author', 'user_id', 'author_id'),
+    )
 
 
 class InterestCategory(Base):
@@ -77,4 +135,31 @@ class FanType(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), unique=True, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CatalogVersion(Base):
+    """目录数据（兴趣类别、粉丝类型）的版本号，写入时加一，各 worker 轮询它判断缓存是否过期"""
+    __tablename__ = "catalog_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, default=0)
+
+
+class PostScore(Base):
+    """帖子热度检查点（utils/trending.py），各 worker 定时合并本进程的增量，重启后从这里恢复"""
+    __tablename__ = "post_scores"
+
+    post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True)
+    score = Column(Float, nullable=False)  # 衰减到 updated_at 时刻的分数
+    updated_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, index=True)  # 分数衰减到 TRENDING_MIN_SCORE 的时刻，之后可以删除
+
+
+class SchemaVersion(Base):
+    """库表结构版本，只有 id=1 一行，由 scripts/migrate_schema.py 写入，worker 启动时检查"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, field_validator
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class UserCreate(BaseModel):
@@ -57,13 +57,29 @@ class PostResponse(BaseModel):
 
 
 class PagedPostResponse(BaseModel):
-    total: int
+    total: Optional[int] = None
     posts: List[PostResponse]
+    next_cursor: Optional[str] = None
+    liked_post_ids: Optional[List[int]] = None  # include_liked=true 时返回本页中当前用户赞过的帖子
 
     class Config:
         orm_mode = True
 
 
+class SearchPostsResponse(BaseModel):
+    posts: List[PostResponse]
+    next_cursor: Optional[str] = None
+
+
+class HotPost(BaseModel):
+    post: PostResponse
+    score: float  # 衰减到此刻的热度
+
+
+class HotPostsResponse(BaseModel):
+    posts: List[HotPost]
+
+
 class CommentCreate(BaseModel):
     content: str
     nickname: str = None
@@ -88,6 +104,7 @@ class LikeCreate(BaseModel):
 class LikeResponse(BaseModel):
     id: int
     post_id: int
+    user_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -99,6 +116,31 @@ class FollowCreate(BaseModel):
     following_id: int
 
 
+class LikeBatchCreate(BaseModel):
+    post_ids: List[int]
+
+
+class LikedPostsResponse(BaseModel):
+    post_ids: List[int]
+
+
+class CommentBatchItem(CommentCreate):
+    post_id: int
+
+
+class CommentBatchCreate(BaseModel):
+    comments: List[CommentBatchItem]
+
+
+class FollowBatchCreate(BaseModel):
+    following_ids: List[int]
+
+
+class BatchCreateResponse(BaseModel):
+    created: int
+    skipped: List[int] = []  # 目标不存在或已存在而跳过的 id
+
+
 class FollowResponse(BaseModel):
     id: int
     follower_id: int
@@ -111,6 +153,7 @@ class FollowResponse(BaseModel):
 
 class CommentsListResponse(BaseModel):
     comments: List[CommentResponse]
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -123,6 +166,10 @@ class LikeCountResponse(BaseModel):
         orm_mode = True
 
 
+class LikeCountsResponse(BaseModel):
+    counts: Dict[int, int]
+
+
 class FollowedUser(BaseModel):
     id: int
     phone_number: str
@@ -134,9 +181,44 @@ class FollowedUser(BaseModel):
         orm_mode = True
 
 
+class PublicUser(BaseModel):
+    """返回给与该用户没有关注关系的调用方，不含手机号"""
+    id: int
+    nickname: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class UserListResponse(BaseModel):
+    users: List[PublicUser]
+    next_cursor: Optional[str] = None
+
+
+class DiscoveredUser(BaseModel):
+    user: PublicUser
+    score: float
+
+
+class DiscoverResponse(BaseModel):
+    users: List[DiscoveredUser]
+
+
+class SuggestedUser(BaseModel):
+    user: PublicUser
+    path_count: int  # 我关注的人中有多少人关注了他
+
+
+class SuggestionsResponse(BaseModel):
+    users: List[SuggestedUser]
+
+
 class FollowingListResponse(BaseModel):
     following: List[FollowedUser]
     count: int
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -145,6 +227,7 @@ class FollowingListResponse(BaseModel):
 class FollowersListResponse(BaseModel):
     followers: List[FollowedUser]
     count: int
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,47 @@
+# 兴趣重合推荐基准：随机生成用户标签，测量单次 top-K 查询耗时
+# 用法（在项目根目录）：python -m scripts.bench_discover --users 1000000 --categories 30 --fan-types 20
+import argparse
+import time
+import numpy as np
+from utils.discover import DiscoverIndex
+
+
+def random_pairs(rng, user_ids, tag_count, max_tags):
+    # 每个用户随机 0..max_tags 个标签，允许重复（位图去重）
+    per_user = rng.integers(0, max_tags + 1, size=len(user_ids))
+    return np.repeat(user_ids, per_user), rng.integers(1, tag_count + 1, size=int(per_user.sum()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--categories', type=int, default=30)
+    parser.add_argument('--fan-types', type=int, default=20)
+    parser.add_argument('--max-tags', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    user_ids = np.arange(1, args.users + 1, dtype=np.int64)
+    index = DiscoverIndex(1.0, 1.0, refresh_interval=0, rebuild_interval=float('inf'))
+    started = time.perf_counter()
+    index.append(user_ids, random_pairs(rng, user_ids, args.categories, args.max_tags),
+                 random_pairs(rng, user_ids, args.fan_types, args.max_tags))
+    print('build: %d users in %.2fs, %.1f MB' % (index.size, time.perf_counter() - started,
+                                                   index.stats()['bytes'] / 1024 / 1024))
+
+    # 模拟每个用户关注了 200 人
+    timings = []
+    for user_id in rng.integers(1, args.users + 1, size=args.queries):
+        following = rng.integers(1, args.users + 1, size=200).tolist()
+        started = time.perf_counter()
+        index.top_k(int(user_id), following, args.limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print('top_k(limit=%d): p50 %.1f ms, p95 %.1f ms, max %.1f ms' % (
+        args.limit, timings[len(timings) // 2], timings[int(len(timings) * 0.95)], timings[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# 全文搜索基准：生成百万级的合成中文帖子（汉字按 Zipf 分布，夹杂标点和英文词），
+# 直接在内存里构建 utils/search.py 的倒排索引，统计构建耗时、索引大小和各类查询的延迟，
+# 并与逐条子串匹配（相当于 LIKE '%q%' 全表扫描）对比
+# 用法（在项目根目录）：python -m scripts.bench_search [--posts 2000000] [--queries 200]
+import argparse
+import statistics
+import time
+import numpy as np
+from utils.search import SearchIndex
+
+CJK_BASE = 0x4E00
+ENGLISH_WORDS = ["iphone", "python", "vlog", "ootd", "mbti", "nba", "kpop", "ai"]
+
+
+def generate_corpus(count: int, seed: int = 42):
+    """返回 count 条帖子文本，长度 10~120 字"""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(10, 120, size=count)
+    total = int(lengths.sum())
+    # 3500 个常用字，越靠前越常见
+    ranks = np.minimum(rng.zipf(1.3, size=total), 3500) - 1
+    codes = (CJK_BASE + ranks).astype(np.uint32)
+    codes[rng.random(total) < 0.08] = ord("，")
+    text = codes.tobytes().decode("utf-32-le")
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    posts = [text[offsets[i]:offsets[i + 1]] for i in range(count)]
+    for i in rng.choice(count, size=count // 20, replace=False):
+        posts[i] += " " + ENGLISH_WORDS[i % len(ENGLISH_WORDS)]
+    return posts
+
+
+def pick_queries(posts, count: int, seed: int = 7):
+    """从语料中截取片段作查询，按长度分成常见词（2 字）、短语（4 字）和长短语（8 字）"""
+    rng = np.random.default_rng(seed)
+    queries = {"2 chars": [], "4 chars": [], "8 chars": [], "english": ENGLISH_WORDS}
+    while min(len(queries[kind]) for kind in ("2 chars", "4 chars", "8 chars")) < count:
+        post = posts[int(rng.integers(len(posts)))]
+        for kind, size in (("2 chars", 2), ("4 chars", 4), ("8 chars", 8)):
+            start = int(rng.integers(max(1, len(post) - size)))
+            fragment = post[start:start + size]
+            if len(fragment) == size and "，" not in fragment and " " not in fragment and len(queries[kind]) < count:
+                queries[kind].append(fragment)
+    return queries
+
+
+def percentile(values, p):
+    return sorted(values)[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=2000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=5, help="深翻页测试翻到第几页")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--scan-queries", type=int, default=5, help="子串扫描对比的查询数，0 表示跳过")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    posts = generate_corpus(args.posts)
+    print("generated %d posts (%.1f M chars) in %.1fs" % (
+        len(posts), sum(map(len, posts)) / 1e6, time.perf_counter() - started))
+
+    index = SearchIndex(refresh_interval=3600, rebuild_interval=3600, compact_threshold=10 ** 9)
+    started = time.perf_counter()
+    index.load_posts((list(range(start + 1, start + 1 + len(posts[start:start + args.batch_size]))),
+                      posts[start:start + args.batch_size]) for start in range(0, len(posts), args.batch_size))
+    stats = index.stats()
+    print("built index in %.1fs: %d terms, %d postings, %.1f MB" % (
+        time.perf_counter() - started, stats["terms"], stats["postings"], stats["index_bytes"] / 1e6))
+
+    print("%-10s %8s %9s %9s %9s" % ("query", "hits", "p50 ms", "p99 ms", "max ms"))
+    for kind, queries in pick_queries(posts, args.queries).items():
+        latencies, hits = [], []
+        for query in queries:
+            query_started = time.perf_counter()
+            result, _ = index.search(query, args.page_size + 1)
+            latencies.append((time.perf_counter() - query_started) * 1000)
+            hits.append(len(result))
+        print("%-10s %8.1f %9.2f %9.2f %9.2f" % (kind, statistics.mean(hits), percentile(latencies, 0.5),
+                                                 percentile(latencies, 0.99), max(latencies)))
+
+    # 深翻页：每页带上一页最后一条的 (score, id) 和首页的语料统计，延迟不应随页数明显增长；
+    # 每翻一页插入几条含查询词的新帖，拼起来的各页应与翻页前一次取出的完整结果一致
+    query = pick_queries(posts, 1)["2 chars"][0]
+    expected, _ = index.search(query, args.page_size * args.pages)
+    cursor = corpus = None
+    pages = []
+    next_id = len(posts) + 1
+    for page in range(1, args.pages + 1):
+        page_started = time.perf_counter()
+        result, corpus = index.search(query, args.page_size + 1, cursor, corpus)
+        print("page %d of %r: %d results in %.2f ms" % (page, query, len(result),
+                                                          (time.perf_counter() - page_started) * 1000))
+        pages += result[:args.page_size]
+        if len(result) <= args.page_size:
+            break
+        cursor = result[args.page_size - 1]
+        for text in (query, query * 3, posts[0] + query):
+            index.add_post(next_id, text)
+            next_id += 1
+    assert pages == expected[:len(pages)], "pages changed after inserts between them"
+    print("pages consistent across %d inserts" % (next_id - len(posts) - 1))
+
+    if args.scan_queries:
+        queries = pick_queries(posts, args.scan_queries)["4 chars"]
+        started = time.perf_counter()
+        for query in queries:
+            [i for i, post in enumerate(posts) if query in post]
+        print("substring scan: %.1f ms per query" % ((time.perf_counter() - started) * 1000 / len(queries)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# 启动耗时基准：import main 的耗时（及最重的模块），以及 uvicorn worker 从启动到能响应请求的时间和首个请求的延迟
+# 用法（在项目根目录）：python -m scripts.bench_startup [--runs 5] [--database-url sqlite:///./bench_startup.db]
+# 库会先执行 bootstrap；用 -X importtime 统计模块导入耗时
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import requests
+from sqlalchemy import create_engine
+from scripts.loadtest import PROJECT_ROOT, free_port
+from utils.schema import bootstrap
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure_import(env):
+    """在新进程里 import main，返回 (总耗时秒, [(累计微秒, 模块名)])"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        # 只统计 main 直接导入的模块（缩进两格）和 main 本身
+        if match and len(match.group(3)) <= 3:
+            modules.append((int(match.group(2)), match.group(4)))
+    return elapsed, modules
+
+
+def measure_server(env, path):
+    """启动一个 uvicorn worker，返回 (到首次响应成功的秒数, 首个请求耗时, 第二个请求耗时)"""
+    port = free_port()
+    url = 'http://127.0.0.1:%d' % port
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+                                '--log-level', 'warning'], cwd=PROJECT_ROOT, env=env)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('server exited with code %d' % process.returncode)
+            try:
+                requests.get(url + '/metrics', timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+        latencies = []
+        for _ in range(2):
+            request_started = time.perf_counter()
+            response = requests.get(url + path, timeout=10)
+            latencies.append(time.perf_counter() - request_started)
+            response.raise_for_status()
+        return ready, latencies[0], latencies[1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--database-url', default='sqlite:///./bench_startup.db')
+    parser.add_argument('--path', default='/interest_categories', help='测首个请求延迟用的接口')
+    parser.add_argument('--top', type=int, default=10, help='列出最慢的几个直接导入')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    bootstrap(engine)
+    engine.dispose()
+    env = dict(os.environ, DATABASE_URL=args.database_url)
+
+    imports, servers, slowest = [], [], {}
+    for _ in range(args.runs):
+        elapsed, modules = measure_import(env)
+        imports.append(elapsed)
+        for cumulative, name in modules:
+            slowest.setdefault(name, []).append(cumulative)
+        servers.append(measure_server(env, args.path))
+
+    print('import main (process)  median %7.1f ms  min %7.1f ms' % (
+        statistics.median(imports) * 1000, min(imports) * 1000))
+    for label, index in (('worker ready', 0), ('first request', 1), ('second request', 2)):
+        values = [server[index] for server in servers]
+        print('%-22s median %7.1f ms  min %7.1f ms' % (label, statistics.median(values) * 1000, min(values) * 1000))
+    print('slowest imports (cumulative, median):')
+    ranked = sorted(((statistics.median(values), name) for name, values in slowest.items()), reverse=True)
+    for micros, name in ranked[:args.top]:
+        print('  %-30s %7.1f ms' % (name, micros / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# 查询预算回归检查：在临时 SQLite 库上分两轮灌入不同规模的数据，逐个请求列表/详情接口，
+# 要求每个接口的语句数不随数据量增长、不超过 @query_budget 声明的上限，且没有重复执行的同形状语句（N+1）
+# 用法（在项目根目录）：python -m scripts.check_query_budgets [--small 3] [--large 30]
+# 可叠加 ASYNC_DB=true / TIMELINE_ENABLED=true / FAST_JSON=true 检查对应的实现，发现问题时退出码为 1
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+DB_DIR = tempfile.mkdtemp(prefix="query_budget_")
+os.environ["DATABASE_URL"] = "sqlite:///%s/check.db" % DB_DIR
+os.environ.setdefault("ASYNC_DATABASE_URL", "sqlite+aiosqlite:///%s/check.db" % DB_DIR)
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["METRICS_ENABLED"] = os.environ["SERVER_TIMING_ENABLED"] = "true"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# 关掉按时间触发的增量拉取，否则语句数取决于检查跑了多久
+os.environ["FOLLOW_GRAPH_REFRESH_INTERVAL"] = os.environ["DISCOVER_REFRESH_INTERVAL"] = "3600"
+os.environ["SEARCH_REFRESH_INTERVAL"] = "3600"
+os.environ["CATALOG_POLL_INTERVAL"] = "3600"
+# 检查的是缓存未命中时的查库路径
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+os.environ["SCHEMA_AUTO_MIGRATE"] = "true"  # 临时库在启动时建表
+
+from fastapi.routing import APIRoute  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+import main  # noqa: E402
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+# 不访问数据库的运维接口不要求声明预算
+UNBUDGETED = re.compile(r"^/(metrics|stats/|docs|redoc|openapi)")
+
+
+def query_count(response):
+    assert response.status_code < 400, (response.request.url, response.status_code, response.text)
+    return int(QUERIES.search(response.headers["server-timing"]).group(1))
+
+
+class Scenario:
+    def __init__(self, client):
+        self.client = client
+        self.users = []  # [(user_id, headers)]
+        self.post_ids = []
+
+    def register(self, index):
+        phone = "1%010d" % index
+        r = self.client.post("/register", json={"phone_number": phone, "password": "x", "nickname": "u%d" % index,
+                                                "interest_categories": ["科技"], "fan_types": ["颜粉"]})
+        user_id = r.json()["id"]
+        r = self.client.post("/login", data={"username": phone, "password": "x"})
+        headers = {"Authorization": "Bearer " + r.json()["access_token"]}
+        self.users.append((user_id, headers))
+        return user_id, headers
+
+    def grow(self, count):
+        """新增 count 个用户，每人发帖、互相关注第一个用户，第一个帖子下的评论和点赞同步增长"""
+        if not self.users:
+            self.client.post("/interest_categories", json={"name": "科技"})
+            self.client.post("/fan_types", json={"name": "颜粉"})
+            self.register(0)
+        owner_id, owner = self.users[0]
+        start = len(self.users)
+        for index in range(start, start + count):
+            user_id, headers = self.register(index)
+            for _ in range(2):
+                r = self.client.post("/post", json={"content": "帖子 %d" % index}, headers=headers)
+                self.post_ids.append(r.json()["id"])
+            self.client.post("/follow", json={"following_id": owner_id}, headers=headers)
+            if index % 2:
+                self.client.post("/follow", json={"following_id": user_id}, headers=owner)
+            self.client.post("/comment?post_id=%d" % self.post_ids[0], json={"content": "评论", "nickname": "n"})
+            self.client.post("/like", json={"post_id": self.post_ids[0]}, headers=headers)
+        self.client.post("/likes/batch", json={"post_ids": self.post_ids[-count:][:20]}, headers=self.users[-1][1])
+        self.client.post("/comments/batch", json={"comments": [
+            {"post_id": post_id, "content": "批量", "nickname": "n"} for post_id in self.post_ids[-count:][:20]]})
+        self.client.post("/follows/batch", json={"following_ids": [user_id for user_id, _ in self.users[1:21]]},
+                         headers=self.users[-1][1])
+
+    def requests(self):
+        owner_id, owner = self.users[0]
+        post_id, other_id = self.post_ids[0], self.users[1][0]
+        ids = ",".join(str(i) for i in self.post_ids[-20:])
+        return [
+            ("/posts?ids=%s" % ids, None),
+            ("/posts/likes?ids=%s" % ids, None),
+            ("/search/posts?q=帖子&page_size=5", None),
+            ("/posts/hot", None),
+            ("/post/%d/comments" % post_id, None),
+            ("/post/%d/comments/stream" % post_id, None),
+            ("/post/%d/likes" % post_id, None),
+            ("/me/following", owner),
+            ("/me/followers", owner),
+            ("/me/discover", owner),
+            ("/me/mutuals", owner),
+            ("/me/follow_backs", owner),
+            ("/user/%d/followed_by" % owner_id, self.users[-1][1]),
+            ("/me/suggestions", self.users[2][1]),
+            ("/me/posts", owner),
+            ("/me/posts?include_total=false", owner),
+            ("/me/following/posts", owner),
+            ("/me/following/posts?include_liked=true", owner),
+            ("/user/%d/posts" % other_id, owner),
+            ("/user/%d/posts?include_liked=true" % other_id, owner),
+            ("/me/liked?ids=%s" % ids, self.users[-1][1]),
+            ("/interest_categories", None),
+            ("/interest_categories/1/users", owner),
+            ("/fan_types", None),
+            ("/fan_types/1/users", owner),
+        ]
+
+    def measure(self):
+        counts = {}
+        for path, headers in self.requests():
+            self.client.get(path, headers=headers)  # 预热认证缓存、目录缓存和内存索引
+            counts[path.split("?")[0] if "ids=" in path else path] = query_count(
+                self.client.get(path, headers=headers))
+        return counts
+
+
+def budget_of(path):
+    for route in main.app.router.routes:
+        if isinstance(route, APIRoute) and "GET" in route.methods and route.path_regex.match(path.split("?")[0]):
+            return getattr(route.endpoint, "query_budget", None)
+    return None
+
+
+def check():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--small", type=int, default=3)
+    parser.add_argument("--large", type=int, default=30)
+    args = parser.parse_args()
+
+    failures = []
+    for route in main.app.router.routes:
+        if isinstance(route, APIRoute) and not UNBUDGETED.match(route.path) \
+                and getattr(route.endpoint, "query_budget", None) is None:
+            failures.append("%s %s has no @query_budget" % (",".join(sorted(route.methods)), route.path))
+
+    with TestClient(main.app) as client:
+        scenario = Scenario(client)
+        scenario.grow(args.small)
+        small = scenario.measure()
+        scenario.grow(args.large - args.small)
+        large = scenario.measure()
+
+    print("%-40s %6s %6s %6s" % ("endpoint", "small", "large", "budget"))
+    for path, count in small.items():
+        budget = budget_of(path)
+        print("%-40s %6d %6d %6s" % (path, count, large[path], budget))
+        if large[path] != count:
+            failures.append("%s: %d queries with %d users, %d with %d users" % (
+                path, count, args.small, large[path], args.large))
+        if budget is not None and max(count, large[path]) > budget:
+            failures.append("%s: %d queries, budget %d" % (path, max(count, large[path]), budget))
+    for failure in failures:
+        print("FAIL", failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,306 @@
+# 压测工具：生成合成数据集，并发跑混合读写负载，按接口统计吞吐与 p50/p95/p99 写入 JSON
+# 用法（在项目根目录）：
+#   本地起服务（SQLite）：python -m scripts.loadtest --reset --users 2000 --duration 30 --concurrency 16 --output run.json
+#   打已有服务：      python -m scripts.loadtest --url http://127.0.0.1:8000 --database-url mysql+pymysql://... --skip-seed
+#   与基线对比：      python -m scripts.loadtest --skip-seed --output new.json --compare run.json
+# 服务端和数据集需要使用同一个数据库；压测账号的密码统一为 --password
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import requests
+from sqlalchemy import create_engine, insert, select, func
+import models
+from scripts.bench_follow_graph import power_law_ids, synthetic_edges
+from utils.hashing import hash_password
+from utils.schema import bootstrap
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZE = 5000
+
+# 动作: (权重, 接口标签)
+ACTIONS = {
+    "feed": (45, "GET /me/following/posts"),
+    "comments": (15, "GET /post/{id}/comments"),
+    "like": (20, "POST /like"),
+    "post": (10, "POST /post"),
+    "comment": (5, "POST /comment"),
+    "login": (5, "POST /login"),
+}
+
+
+def insert_batches(conn, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(insert(table), rows[start:start + BATCH_SIZE])
+
+
+def seed(database_url, users, follows, posts, comments, likes, password, rng, reset=False):
+    """生成合成数据：关注关系与发帖/评论/点赞的对象都服从幂律分布，少数用户和帖子占大头"""
+    engine = create_engine(database_url)
+    if reset:
+        models.Base.metadata.drop_all(engine)
+    bootstrap(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(models.User.__table__)).scalar()
+    if existing:
+        print('database already has %d users, skip seeding (use --reset to rebuild)' % existing)
+        engine.dispose()
+        return existing
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    hashed = hash_password(password)  # 所有账号共用一个哈希，避免生成数据时逐个算 bcrypt
+
+    follower, following = synthetic_edges(rng, users, follows, 1.8)
+    follower_count = np.bincount(following, minlength=users + 1)
+    following_count = np.bincount(follower, minlength=users + 1)
+
+    post_authors = power_law_ids(rng, users, posts, 2.0)
+    post_times = [now - timedelta(seconds=int(s)) for s in np.sort(rng.integers(0, 30 * 86400, size=posts))[::-1]]
+    liked_posts = power_law_ids(rng, posts, likes, 1.5)
+    like_count = np.bincount(liked_posts, minlength=posts + 1)
+    commented_posts = power_law_ids(rng, posts, comments, 1.5)
+
+    with engine.begin() as conn:
+        insert_batches(conn, models.User.__table__, [dict(
+            id=i, phone_number='1%010d' % i, hashed_password=hashed, nickname='压测用户%d' % i,
+            interest_categories='', fan_types='', follower_count=int(follower_count[i]),
+            following_count=int(following_count[i]), created_at=now, updated_at=now) for i in range(1, users + 1)])
+        insert_batches(conn, models.Follow.__table__, [dict(
+            follower_id=int(a), following_id=int(b), created_at=now) for a, b in zip(follower, following)])
+        insert_batches(conn, models.Post.__table__, [dict(
+            id=i + 1, content='压测帖子 %d：%s' % (i + 1, '内容' * int(rng.integers(5, 50))), user_id=int(author),
+            like_count=int(like_count[i + 1]), created_at=created_at, updated_at=created_at)
+            for i, (author, created_at) in enumerate(zip(post_authors, post_times))])
+        insert_batches(conn, models.Comment.__table__, [dict(
+            post_id=int(post_id), content='压测评论', nickname='压测用户', created_at=now, updated_at=now)
+            for post_id in commented_posts])
+        insert_batches(conn, models.Like.__table__, [dict(post_id=int(post_id), created_at=now, updated_at=now)
+                                                      for post_id in liked_posts])
+    engine.dispose()
+    print('seeded %d users, %d follows, %d posts, %d comments, %d likes in %.1fs' % (
+        users, len(follower), posts, comments, likes, time.perf_counter() - started))
+    if os.getenv('TIMELINE_ENABLED', 'false').lower() == 'true':
+        print('TIMELINE_ENABLED is on: run python -m scripts.rebuild_timeline before the load test')
+    return users
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url, workers):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url)
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+                                '--port', str(port), '--workers', str(workers), '--log-level', 'warning'],
+                               cwd=PROJECT_ROOT, env=env)
+    url = 'http://127.0.0.1:%d' % port
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited with code %d' % process.returncode)
+        try:
+            if requests.get(url + '/interest_categories', timeout=1).status_code == 200:
+                return process, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('server did not start within 60s')
+
+
+class Worker(threading.Thread):
+    """一个虚拟用户：登录后按权重随机执行动作，记录每个请求的耗时"""
+
+    def __init__(self, url, users, posts, password, deadline, seed):
+        super().__init__(daemon=True)
+        self.url = url
+        self.users = users
+        self.posts = posts
+        self.password = password
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.samples = {}  # 接口标签 -> [(耗时毫秒, 是否成功)]
+        self.actions = list(ACTIONS)
+        self.weights = [ACTIONS[name][0] for name in self.actions]
+
+    def request(self, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            ok = self.session.request(method, self.url + path, timeout=30, **kwargs).status_code < 400
+        except requests.RequestException:
+            ok = False
+        self.samples.setdefault(label, []).append(((time.perf_counter() - started) * 1000, ok))
+        return ok
+
+    def login(self):
+        phone_number = '1%010d' % self.rng.randint(1, self.users)
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.url + '/login', timeout=30,
+                                         data={'username': phone_number, 'password': self.password})
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        self.samples.setdefault(ACTIONS['login'][1], []).append(((time.perf_counter() - started) * 1000, ok))
+        if ok:
+            self.session.headers['Authorization'] = 'Bearer ' + response.json()['access_token']
+
+    def random_post_id(self):
+        # 请求按幂律集中在少数帖子上（id 越小越热），模拟热点
+        return min(int(self.rng.paretovariate(1.2)), self.posts)
+
+    def run(self):
+        self.login()
+        while time.monotonic() < self.deadline:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            label = ACTIONS[action][1]
+            if action == 'feed':
+                self.request(label, 'GET', '/me/following/posts', params={'page_size': 20, 'include_total': 'false'})
+            elif action == 'comments':
+                self.request(label, 'GET', '/post/%d/comments' % self.random_post_id(), params={'page_size': 50})
+            elif action == 'like':
+                self.request(label, 'POST', '/like', json={'post_id': self.random_post_id()})
+            elif action == 'post':
+                self.request(label, 'POST', '/post', json={'content': '压测新帖 %d' % self.rng.randint(1, 10 ** 9)})
+            elif action == 'comment':
+                self.request(label, 'POST', '/comment', params={'post_id': self.random_post_id()},
+                             json={'content': '压测评论', 'nickname': '压测用户'})
+            elif action == 'login':
+                self.login()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize(samples, elapsed):
+    def stats(entries):
+        latencies = sorted(latency for latency, _ in entries)
+        errors = sum(1 for _, ok in entries if not ok)
+        return {
+            'count': len(entries),
+            'errors': errors,
+            'rps': len(entries) / elapsed,
+            'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+        }
+
+    endpoints = {label: stats(entries) for label, entries in sorted(samples.items())}
+    return endpoints, stats([entry for entries in samples.values() for entry in entries])
+
+
+def run_load(url, users, posts, password, concurrency, duration, seed):
+    deadline = time.monotonic() + duration
+    workers = [Worker(url, users, posts, password, deadline, seed * 1000 + i) for i in range(concurrency)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    samples = {}
+    for worker in workers:
+        for label, entries in worker.samples.items():
+            samples.setdefault(label, []).extend(entries)
+    return summarize(samples, elapsed)
+
+
+def print_report(endpoints, total):
+    print('%-28s %8s %7s %9s %9s %9s %9s' % ('endpoint', 'count', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for label, stats in list(endpoints.items()) + [('TOTAL', total)]:
+        print('%-28s %8d %7d %9.1f %9.1f %9.1f %9.1f' % (
+            label, stats['count'], stats['errors'], stats['rps'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms']))
+
+
+def print_comparison(baseline, result):
+    """与基线逐接口对比，正数表示变慢（延迟）或变快（吞吐）"""
+    print('%-28s %12s %12s %12s %12s' % ('vs baseline', 'req/s', 'p50', 'p95', 'p99'))
+    rows = list(result['endpoints'].items()) + [('TOTAL', result['total'])]
+    for label, stats in rows:
+        base = baseline['total'] if label == 'TOTAL' else baseline['endpoints'].get(label)
+        if not base:
+            print('%-28s %12s' % (label, 'new'))
+            continue
+
+        def change(key):
+            return '%+.1f%%' % ((stats[key] - base[key]) / base[key] * 100) if base[key] else 'n/a'
+
+        print('%-28s %12s %12s %12s %12s' % (label, change('rps'), change('p50_ms'), change('p95_ms'),
+                                              change('p99_ms')))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='已运行服务的地址；不传则用 --database-url 在本地起 uvicorn')
+    parser.add_argument('--database-url', default='sqlite:///./loadtest.db')
+    parser.add_argument('--server-workers', type=int, default=1)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--follows', type=int, default=40000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--comments', type=int, default=40000)
+    parser.add_argument('--likes', type=int, default=100000)
+    parser.add_argument('--password', default='loadtest')
+    parser.add_argument('--reset', action='store_true', help='删除并重建所有表后重新生成数据')
+    parser.add_argument('--skip-seed', action='store_true')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，数据集和请求序列都由它决定')
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    parser.add_argument('--compare', help='作为基线对比的 JSON 文件')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    users, posts = args.users, args.posts
+    if not args.skip_seed:
+        users = seed(args.database_url, args.users, args.follows, args.posts, args.comments, args.likes,
+                     args.password, rng, reset=args.reset)
+    engine = create_engine(args.database_url)
+    with engine.connect() as conn:
+        users = conn.execute(select(func.count()).select_from(models.User.__table__)).scalar()
+        posts = conn.execute(select(func.max(models.Post.__table__.c.id))).scalar() or 1
+    engine.dispose()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.database_url, args.server_workers)
+    try:
+        endpoints, total = run_load(url, users, posts, args.password, args.concurrency, args.duration, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    result = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'endpoints': endpoints,
+        'total': total,
+    }
+    print_report(endpoints, total)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print('results written to %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
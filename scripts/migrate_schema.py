@@ -0,0 +1,31 @@
+# 库表结构初始化/迁移：建表、给已有的表补上缺少的列和索引、写入结构版本，可重复执行
+# 部署时在启动（或滚动重启）worker 之前执行一次；worker 启动时只检查 schema_version
+# 用法（在项目根目录）：python -m scripts.migrate_schema [--database-url URL] [--check]
+import argparse
+import logging
+import sys
+from sqlalchemy import create_engine
+from config import settings
+from utils.schema import SCHEMA_VERSION, bootstrap, current_version
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=settings.DATABASE_URL)
+    parser.add_argument('--check', action='store_true', help='只检查版本，落后于代码时退出码为 1')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    engine = create_engine(args.database_url)
+    try:
+        if args.check:
+            version = current_version(engine)
+            print('database schema version %s, code version %d' % (version, SCHEMA_VERSION))
+            sys.exit(0 if version is not None and version >= SCHEMA_VERSION else 1)
+        print('schema version %d' % bootstrap(engine))
+    finally:
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# 在线迁移：把 users 表中逗号分隔的 interest_categories / fan_types 写入关联表
+# 按用户 id 分批、每批一个短事务，重复执行是幂等的，可用 --start-id 从中断处继续
+# 用法（在项目根目录）：python -m scripts.migrate_user_tags --batch-size 1000
+import argparse
+import time
+from models import User, InterestCategory, FanType, UserInterestCategory, UserFanType
+from utils.crud import insert_ignore
+from utils.database import engine, SessionLocal
+from utils.schema import check_schema
+
+
+def split_names(value):
+    return [name for name in (value or "").split(",") if name]
+
+
+def migrate_user_tags(batch_size=1000, start_id=0, pause=0.0):
+    check_schema(engine)
+    db = SessionLocal()
+    try:
+        category_ids = {row.name: row.id for row in db.query(InterestCategory.id, InterestCategory.name)}
+        fan_type_ids = {row.name: row.id for row in db.query(FanType.id, FanType.name)}
+        last_id = start_id
+        while True:
+            users = db.query(User.id, User.interest_categories, User.fan_types).filter(User.id > last_id).order_by(
+                User.id).limit(batch_size).all()
+            if not users:
+                break
+            category_rows = [dict(user_id=user.id, category_id=category_ids[name]) for user in users
+                             for name in set(split_names(user.interest_categories)) if name in category_ids]
+            fan_type_rows = [dict(user_id=user.id, fan_type_id=fan_type_ids[name]) for user in users
+                             for name in set(split_names(user.fan_types)) if name in fan_type_ids]
+            if category_rows:
+                db.execute(insert_ignore(db, UserInterestCategory), category_rows)
+            if fan_type_rows:
+                db.execute(insert_ignore(db, UserFanType), fan_type_rows)
+            db.commit()
+            last_id = users[-1].id
+            print('migrated up to user', last_id)
+            if pause:
+                # 给线上流量让出数据库
+                time.sleep(pause)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--start-id', type=int, default=0)
+    parser.add_argument('--pause', type=float, default=0.0, help='每批之间暂停的秒数')
+    args = parser.parse_args()
+    migrate_user_tags(args.batch_size, args.start_id, args.pause)
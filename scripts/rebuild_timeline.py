@@ -0,0 +1,39 @@
+# 重建所有用户的关注流收件箱，开启 TIMELINE_ENABLED 前对已有数据执行一次
+# 用法（在项目根目录）：python -m scripts.rebuild_timeline
+from models import User, Follow
+from utils.crud import recount_follow_counts
+from utils.database import engine, SessionLocal
+from utils.schema import check_schema
+from utils.timeline import clear_timeline, backfill_timeline, mark_pull_authors
+
+BATCH_SIZE = 500
+
+
+def rebuild_timeline():
+    check_schema(engine)
+    db = SessionLocal()
+    last_id = 0
+    try:
+        # 先校正粉丝数，大V 判断依赖它；当前的大V 从此读时合并
+        recount_follow_counts(db)
+        mark_pull_authors(engine)
+        while True:
+            user_ids = [row.id for row in db.query(User.id).filter(User.id > last_id).order_by(User.id).limit(
+                BATCH_SIZE)]
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                following_ids = [row.following_id for row in
+                                 db.query(Follow.following_id).filter(Follow.follower_id == user_id)]
+                clear_timeline(db, user_id)
+                if following_ids:
+                    backfill_timeline(db, user_id, following_ids)
+            db.commit()
+            last_id = user_ids[-1]
+            print('rebuilt up to user', last_id)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    rebuild_timeline()
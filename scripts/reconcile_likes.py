@@ -0,0 +1,7 @@
+# 按 likes 表校正 posts.like_count，可由定时任务执行
+# 用法（在项目根目录）：python -m scripts.reconcile_likes
+from utils.like_buffer import reconcile_like_counts
+
+
+if __name__ == '__main__':
+    print('reconciled posts:', reconcile_like_counts())
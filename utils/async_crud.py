@@ -0,0 +1,69 @@
+# utils/crud.py 查询的异步版本：简单查询直接用 select，
+# 复杂查询通过 AsyncSession.run_sync 复用同步实现，IO 仍由异步驱动完成
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Post, Like
+from utils import crud
+from utils.like_buffer import like_buffer
+
+
+async def get_post_by_id(db: AsyncSession, post_id: int):
+    return await db.get(Post, post_id)
+
+
+async def get_like_count_by_post_id(db: AsyncSession, post_id: int):
+    like_count = (await db.execute(select(Post.like_count).where(Post.id == post_id))).first()
+    if like_count is None:
+        return None
+    return (like_count[0] or 0) + like_buffer.pending(post_id)
+
+
+async def get_comments_by_post_id(db: AsyncSession, post_id: int, limit: int = None, cursor=None, columns=None):
+    return await db.run_sync(crud.get_comments_by_post_id, post_id, limit=limit, cursor=cursor, columns=columns)
+
+
+async def get_user_posts(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10, cursor=None, columns=None):
+    return await db.run_sync(crud.get_user_posts, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
+
+
+async def get_user_post_count(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_user_post_count, user_id)
+
+
+async def get_following_users_posts(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 10, cursor=None,
+                                    columns=None):
+    return await db.run_sync(crud.get_following_users_posts, user_id, skip=skip, limit=limit, cursor=cursor,
+                             columns=columns)
+
+
+async def get_following_users_post_count(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_following_users_post_count, user_id)
+
+
+async def get_specific_following_user_posts(db: AsyncSession, follower_id: int, following_id: int, skip: int = 0,
+                                            limit: int = 10, cursor=None, columns=None):
+    return await db.run_sync(crud.get_specific_following_user_posts, follower_id, following_id, skip=skip,
+                             limit=limit, cursor=cursor, columns=columns)
+
+
+async def get_specific_following_user_post_count(db: AsyncSession, follower_id: int, following_id: int):
+    return await db.run_sync(crud.get_specific_following_user_post_count, follower_id, following_id)
+
+
+async def get_following_users(db: AsyncSession, user_id: int, limit: int = 20, cursor=None, columns=None):
+    return await db.run_sync(crud.get_following_users, user_id, limit=limit, cursor=cursor, columns=columns)
+
+
+async def get_follower_users(db: AsyncSession, user_id: int, limit: int = 20, cursor=None, columns=None):
+    return await db.run_sync(crud.get_follower_users, user_id, limit=limit, cursor=cursor, columns=columns)
+
+
+async def get_follow_counts(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_follow_counts, user_id)
+
+
+async def get_liked_post_ids(db: AsyncSession, user_id: int, post_ids):
+    if not post_ids:
+        return set()
+    rows = await db.execute(select(Like.post_id).where(Like.user_id == user_id, Like.post_id.in_(set(post_ids))))
+    return {row.post_id for row in rows}
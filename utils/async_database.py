@@ -0,0 +1,14 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from config import settings
+from utils.database import pool_options
+from utils.metrics import instrument_engine
+
+async_engine = create_async_engine(settings.ASYNC_DATABASE_URL, **pool_options(settings.ASYNC_DATABASE_URL))
+if settings.METRICS_ENABLED:
+    instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
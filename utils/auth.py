@@ -1,14 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
+from models import User
 from utils.database import get_db
-from utils.crud import get_user_by_phone, verify_password
+from utils.crud import get_user_by_phone, get_user_by_id, update_password_hash
+from utils.hashing import hashing_pool, verify_and_update
 from config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+
+class Principal:
+    """已认证用户的快照，可跨请求缓存，不绑定数据库会话"""
+    __slots__ = ("id", "phone_number", "nickname")
+
+    def __init__(self, id: int, phone_number: str, nickname: str):
+        self.id = id
+        self.phone_number = phone_number
+        self.nickname = nickname
+
+
+class PrincipalCache:
+    """按 token subject 缓存已认证用户，LRU 淘汰并带过期时间"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, subject: str):
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, subject: str, principal: Principal):
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: str):
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+principal_cache = PrincipalCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, target):
+    # 用户信息变更（包括改手机号）后清掉对应缓存
+    principal_cache.invalidate(target.phone_number)
+    for phone_number in inspect(target).attrs.phone_number.history.deleted:
+        principal_cache.invalidate(phone_number)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -16,29 +96,61 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt  # jose 会带入 ecdsa/rsa/pyasn1，导入较慢，用到时再导入
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, phone_number: str, password: str):
-    user = get_user_by_phone(db, phone_number)
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: Session, phone_number: str, password: str):
+    user = await run_in_threadpool(get_user_by_phone, db, phone_number)
+    if not user:
+        return False
+    valid, new_hash = await hashing_pool.run(verify_and_update, password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # BCRYPT_ROUNDS 调整后，旧哈希在登录成功时透明升级
+        await run_in_threadpool(update_password_hash, db, user, new_hash)
     return user
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_token(token: str):
+    """返回 (手机号, 用户 id)，旧 token 没有用户 id"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         phone_number: str = payload.get("sub")
         if phone_number is None:
-            raise credentials_exception
+            raise credentials_exception()
     except JWTError:
-        raise credentials_exception
-    user = get_user_by_phone(db, phone_number=phone_number)
+        raise credentials_exception()
+    return phone_number, payload.get("uid")
+
+
+def load_principal(db: Session, phone_number: str, user_id: int = None):
+    # 新 token 带有 uid，按主键查询；旧 token 仍按手机号查询
+    if user_id is not None:
+        user = get_user_by_id(db, user_id)
+        if user is not None and user.phone_number != phone_number:
+            user = None
+    else:
+        user = get_user_by_phone(db, phone_number=phone_number)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise credentials_exception()
+    principal = Principal(user.id, user.phone_number, user.nickname)
+    principal_cache.set(phone_number, principal)
+    return principal
+
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    phone_number, user_id = decode_token(token)
+    principal = principal_cache.get(phone_number)
+    if principal is not None:
+        return principal
+    return load_principal(db, phone_number, user_id)
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from fastapi import Request, Response
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+from models import CatalogVersion
+from config import settings
+
+CATALOGS = ("interest_categories", "fan_types")
+
+
+def seed_catalog_versions(conn):
+    """预先写入各目录的版本行，写入目录时只需 UPDATE；由 schema.bootstrap 调用"""
+    existing = {row.name for row in conn.execute(select(CatalogVersion.name))}
+    missing = [dict(name=name, version=0) for name in CATALOGS if name not in existing]
+    if missing:
+        conn.execute(insert(CatalogVersion.__table__), missing)
+
+
+def bump_catalog_version(db: Session, name: str):
+    """在写入目录数据的同一事务内调用"""
+    query = db.query(CatalogVersion).filter(CatalogVersion.name == name)
+    values = {CatalogVersion.version: CatalogVersion.version + 1}
+    if not query.update(values, synchronize_session=False):
+        # 没有经过 bootstrap 预置版本行的库：并发的首次写入由 INSERT IGNORE 去重，之后都按 UPDATE 加一
+        from utils.crud import insert_ignore
+        db.execute(insert_ignore(db, CatalogVersion.__table__).values(name=name, version=0))
+        query.update(values, synchronize_session=False)
+
+
+class CatalogCache:
+    """进程内目录缓存：保存序列化好的响应体和 ETag，按版本号失效
+
+    版本号存放在 catalog_versions 表中，每隔 poll_interval 秒最多查询一次，
+    其他 worker 写入后本进程最迟一个轮询周期内感知到。
+    """
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._entries = {}  # name -> (version, body, etag)
+        self._versions = {}
+        self._polled_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _current_version(self, db: Session, name: str):
+        now = time.monotonic()
+        if self._polled_at is None or now - self._polled_at >= self.poll_interval:
+            self._versions = dict(db.query(CatalogVersion.name, CatalogVersion.version).all())
+            self._polled_at = now
+        return self._versions.get(name, 0)
+
+    def get(self, db: Session, name: str, loader):
+        """返回 (body, etag)，loader(db) 负责查询并序列化为 bytes"""
+        version = self._current_version(db, name)
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1], entry[2]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                body = loader(db)
+                entry = (version, body, '"%s"' % hashlib.sha1(body).hexdigest())
+                self._entries[name] = entry
+        return entry[1], entry[2]
+
+    def invalidate(self, name: str):
+        self._entries.pop(name, None)
+        self._polled_at = None
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "not_modified": self.not_modified}
+
+
+catalog_cache = CatalogCache(settings.CATALOG_POLL_INTERVAL)
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, cache=catalog_cache):
+    # no-cache：客户端每次都带 If-None-Match 来校验，未变化时返回 304 不带响应体
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,13 +1,22 @@
+from sqlalchemy import select, func, update, insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from models import User, Post, Comment, Like, Follow, InterestCategory, FanType
+from models import User, Post, Comment, Like, Follow, InterestCategory, FanType, UserInterestCategory, UserFanType
 from schemas import UserCreate, PostCreate, CommentCreate, LikeCreate, FollowCreate, InterestCategoryCreate, \
     FanTypeCreate
-from passlib.context import CryptContext
 from datetime import datetime
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+from config import settings
+from utils.catalog_cache import bump_catalog_version, catalog_cache
+from utils.discover import discover_index
+from utils.follow_graph import follow_graph
+from utils.hashing import hash_password, verify_password
+from utils.like_buffer import like_buffer
+from utils.pagination import keyset_filter
+from utils.response_cache import response_cache
+from utils.search import search_index
+from utils.trending import trending
+from utils.timeline import fan_out_post, backfill_timeline, remove_from_timeline, get_timeline_posts, \
+    get_timeline_post_count
 
 def get_user_by_phone(db: Session, phone_number: str):
     return db.query(User).filter(User.phone_number == phone_number).first()
@@ -17,32 +26,109 @@ def get_user_by_id(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: str = None):
+    # 接口层会先在哈希进程池里算好 hashed_password，脚本等场景直接调用时在这里计算
+    if hashed_password is None:
+        hashed_password = hash_password(user.password)
     interest_categories = ",".join(user.interest_categories) if user.interest_categories else ""
     fan_types = ",".join(user.fan_types) if user.fan_types else ""
     db_user = User(phone_number=user.phone_number, hashed_password=hashed_password, nickname=user.nickname,
                    interest_categories=interest_categories, fan_types=fan_types)
     db.add(db_user)
     try:
+        db.flush()
+        set_user_tags(db, db_user.id, user.interest_categories or [], user.fan_types or [])
         db.commit()
         db.refresh(db_user)
     except Exception as e:
         print(e)
         db.rollback()
         return None
+    discover_index.mark_stale()
     return db_user
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def insert_ignore(db: Session, model):
+    """已存在（主键或唯一键冲突）时跳过的 INSERT"""
+    stmt = insert(model)
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        return stmt.prefix_with("IGNORE")
+    if dialect == "sqlite":
+        return stmt.prefix_with("OR IGNORE")
+    return stmt
+
+
+def insert_new_rows(db: Session, table, rows):
+    """多行 INSERT IGNORE，返回真正插入的行；并发请求抢先插入了其中一部分时，回滚后逐行插入来确定是哪些
+
+    调用前事务中只能有读操作，结果在调用方提交。
+    """
+    try:
+        if db.execute(insert_ignore(db, table), rows).rowcount == len(rows):
+            return rows
+    except IntegrityError:  # 不支持 INSERT IGNORE 的方言
+        pass
+    db.rollback()
+    inserted = []
+    for row in rows:
+        try:
+            with db.begin_nested():
+                result = db.execute(insert_ignore(db, table).values(**row))
+        except IntegrityError:
+            continue
+        if result.rowcount == 1:
+            inserted.append(row)
+    return inserted
+
+
+def set_user_tags(db: Session, user_id: int, interest_categories, fan_types):
+    """按名称写入用户的兴趣类别/粉丝类型关联，目录中不存在的名称只保留在逗号分隔的旧字段中"""
+    if interest_categories:
+        category_ids = [row.id for row in db.query(InterestCategory.id).filter(
+            InterestCategory.name.in_(set(interest_categories)))]
+        if category_ids:
+            db.execute(insert_ignore(db, UserInterestCategory),
+                       [dict(user_id=user_id, category_id=category_id) for category_id in category_ids])
+    if fan_types:
+        fan_type_ids = [row.id for row in db.query(FanType.id).filter(FanType.name.in_(set(fan_types)))]
+        if fan_type_ids:
+            db.execute(insert_ignore(db, UserFanType),
+                       [dict(user_id=user_id, fan_type_id=fan_type_id) for fan_type_id in fan_type_ids])
+
+
+def _page_tagged_users(query, tag_user_id, limit: int = 20, cursor=None):
+    # 在 (标签 id, user_id) 索引上按 user_id 正序翻页，cursor 为 (user_id,)
+    if cursor is not None:
+        query = query.filter(keyset_filter((tag_user_id,), cursor, descending=False))
+    return query.order_by(tag_user_id).limit(limit).all()
+
+
+def get_users_by_interest_category(db: Session, category_id: int, limit: int = 20, cursor=None):
+    return _page_tagged_users(db.query(User).join(UserInterestCategory, UserInterestCategory.user_id == User.id).filter(
+        UserInterestCategory.category_id == category_id), UserInterestCategory.user_id, limit=limit, cursor=cursor)
+
+
+def get_users_by_fan_type(db: Session, fan_type_id: int, limit: int = 20, cursor=None):
+    return _page_tagged_users(db.query(User).join(UserFanType, UserFanType.user_id == User.id).filter(
+        UserFanType.fan_type_id == fan_type_id), UserFanType.user_id, limit=limit, cursor=cursor)
+
+
+def update_password_hash(db: Session, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
 
 
 def create_post(db: Session, post: PostCreate, user_id: int):
-    db_post = Post(content=post.content, user_id=user_id, created_at=datetime.utcnow(), updated_at=datetime.utcnow())
+    db_post = Post(content=post.content, user_id=user_id, like_count=0, created_at=datetime.utcnow(),
+                   updated_at=datetime.utcnow())
     db.add(db_post)
+    if settings.TIMELINE_ENABLED:
+        db.flush()
+        fan_out_post(db, db_post)
     db.commit()
     db.refresh(db_post)
+    search_index.add_post(db_post.id, db_post.content)
     return db_post
 
 
@@ -55,55 +141,238 @@ def create_comment(db: Session, comment: CommentCreate, post_id: int):
                          created_at=datetime.utcnow(), updated_at=datetime.utcnow())
     db.add(db_comment)
     db.commit()
+    response_cache.invalidate(post_id)
+    trending.add(post_id, settings.TRENDING_COMMENT_WEIGHT)
     db.refresh(db_comment)
     return db_comment
 
 
-def create_like(db: Session, post_id: int):
-    db_like = Like(post_id=post_id, created_at=datetime.utcnow(), updated_at=datetime.utcnow())
-    db.add(db_like)
-    db.commit()
-    db.refresh(db_like)
-    return db_like
+def create_like(db: Session, post_id: int, user_id: int):
+    """点赞，幂等：已赞过时不新增记录、不重复计数，返回已有的那条"""
+    now = datetime.utcnow()
+    try:
+        result = db.execute(insert_ignore(db, Like).values(post_id=post_id, user_id=user_id, created_at=now,
+                                                           updated_at=now))
+        db.commit()
+        created = result.rowcount == 1
+    except IntegrityError:  # 不支持 INSERT IGNORE 的方言
+        db.rollback()
+        created = False
+    if created:
+        like_buffer.add(post_id)
+        response_cache.invalidate(post_id)
+        trending.add(post_id, settings.TRENDING_LIKE_WEIGHT)
+    return db.query(Like).filter(Like.user_id == user_id, Like.post_id == post_id).first()
+
+
+def _existing_post_ids(db: Session, post_ids):
+    return {row.id for row in db.query(Post.id).filter(Post.id.in_(set(post_ids)))}
+
+
+def create_comments(db: Session, comments):
+    """批量评论：一条多行 INSERT、一次提交，返回 (新增条数, 不存在的帖子 id)"""
+    existing = _existing_post_ids(db, [comment.post_id for comment in comments])
+    now = datetime.utcnow()
+    rows = [dict(content=comment.content, post_id=comment.post_id, nickname=comment.nickname, created_at=now,
+                 updated_at=now) for comment in comments if comment.post_id in existing]
+    if rows:
+        db.execute(insert(Comment), rows)
+        db.commit()
+    for post_id in {row["post_id"] for row in rows}:
+        response_cache.invalidate(post_id)
+    for row in rows:
+        trending.add(row["post_id"], settings.TRENDING_COMMENT_WEIGHT)
+    return len(rows), sorted({comment.post_id for comment in comments} - existing)
+
+
+def create_likes(db: Session, user_id: int, post_ids):
+    """批量点赞：一条多行 INSERT、一次提交，返回 (新增条数, 帖子不存在或已赞过而跳过的 id)"""
+    post_ids = set(post_ids)
+    new_ids = sorted(_existing_post_ids(db, post_ids) - get_liked_post_ids(db, user_id, post_ids))
+    if new_ids:
+        now = datetime.utcnow()
+        rows = insert_new_rows(db, Like.__table__, [
+            dict(post_id=post_id, user_id=user_id, created_at=now, updated_at=now) for post_id in new_ids])
+        db.commit()
+        # 并发的重复请求已赞过其中一部分时，计数、缓存和热度只按本次真正插入的点赞更新
+        new_ids = [row["post_id"] for row in rows]
+    for post_id in new_ids:
+        like_buffer.add(post_id)
+        response_cache.invalidate(post_id)
+        trending.add(post_id, settings.TRENDING_LIKE_WEIGHT)
+    return len(new_ids), sorted(post_ids - set(new_ids))
+
+
+def get_liked_post_ids(db: Session, user_id: int, post_ids):
+    """post_ids 中当前用户赞过的帖子，一条 IN 查询，走 (user_id, post_id) 唯一索引"""
+    if not post_ids:
+        return set()
+    return {row.post_id for row in db.query(Like.post_id).filter(Like.user_id == user_id,
+                                                                   Like.post_id.in_(set(post_ids)))}
+
+
+def get_posts_by_ids(db: Session, post_ids):
+    # 按请求中的顺序返回，不存在的 id 忽略
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(set(post_ids)))}
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
 
+def get_like_counts_by_post_ids(db: Session, post_ids):
+    rows = db.query(Post.id, Post.like_count).filter(Post.id.in_(set(post_ids)))
+    return {row.id: (row.like_count or 0) + like_buffer.pending(row.id) for row in rows}
 
-def get_comments_by_post_id(db: Session, post_id: int):
-    return db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.created_at).all()
+
+def get_comments_by_post_id(db: Session, post_id: int, limit: int = None, cursor=None, columns=None):
+    # 按时间正序，cursor 为 (created_at, id)；传 columns 时只查这些列，返回行元组
+    query = db.query(*columns) if columns else db.query(Comment)
+    query = query.filter(Comment.post_id == post_id).order_by(Comment.created_at, Comment.id)
+    if cursor is not None:
+        query = query.filter(keyset_filter((Comment.created_at, Comment.id), cursor, descending=False))
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def iter_comments_by_post_id(db: Session, post_id: int, batch_size: int = 1000):
+    """流式读取帖子的全部评论，服务端游标每次取 batch_size 行，按批返回元组"""
+    stmt = select(Comment.id, Comment.content, Comment.post_id, Comment.nickname, Comment.created_at,
+                  Comment.updated_at).where(Comment.post_id == post_id).order_by(Comment.created_at, Comment.id)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        yield rows
 
 
 def get_like_count_by_post_id(db: Session, post_id: int):
-    return db.query(Like).filter(Like.post_id == post_id).count()
+    # 读冗余计数并加上本进程尚未写回的增量，帖子不存在时返回 None
+    row = db.query(Post.like_count).filter(Post.id == post_id).first()
+    if row is None:
+        return None
+    return (row.like_count or 0) + like_buffer.pending(post_id)
+
+
+def _update_follow_counts(db: Session, follower_id: int, following_id: int, delta: int):
+    db.query(User).filter(User.id == following_id).update(
+        {User.follower_count: func.coalesce(User.follower_count, 0) + delta}, synchronize_session=False)
+    db.query(User).filter(User.id == follower_id).update(
+        {User.following_count: func.coalesce(User.following_count, 0) + delta}, synchronize_session=False)
+
+
+def get_follow_counts(db: Session, user_id: int):
+    # 返回 (关注数, 粉丝数)
+    row = db.query(User.following_count, User.follower_count).filter(User.id == user_id).first()
+    if row is None:
+        return 0, 0
+    return row.following_count or 0, row.follower_count or 0
+
+
+def recount_follow_counts(db: Session):
+    # 按 follows 表重新计算关注数和粉丝数
+    follower_count = select(func.count(Follow.id)).where(Follow.following_id == User.id).scalar_subquery()
+    following_count = select(func.count(Follow.id)).where(Follow.follower_id == User.id).scalar_subquery()
+    db.execute(update(User).values(follower_count=follower_count, following_count=following_count))
+    db.commit()
 
 
 def create_follow(db: Session, follower_id: int, following_id: int):
     db_follow = Follow(follower_id=follower_id, following_id=following_id)
     db.add(db_follow)
     try:
-        db.commit()
-        db.refresh(db_follow)
+        db.flush()
     except IntegrityError:
         db.rollback()
         return None
+    _update_follow_counts(db, follower_id, following_id, 1)
+    if settings.TIMELINE_ENABLED:
+        backfill_timeline(db, follower_id, [following_id])
+    db.commit()
+    follow_graph.add_edge(follower_id, following_id)
+    db.refresh(db_follow)
     return db_follow
 
 
-def get_following_users(db: Session, user_id: int):
-    return db.query(Follow).filter(Follow.follower_id == user_id).all()
+def create_follows(db: Session, follower_id: int, following_ids):
+    """批量关注（导入）：一个事务内完成，返回 (新增条数, 用户不存在或已关注而跳过的 id)"""
+    following_ids = set(following_ids)
+    existing_users = {row.id for row in db.query(User.id).filter(User.id.in_(following_ids))}
+    already = {row.following_id for row in db.query(Follow.following_id).filter(
+        Follow.follower_id == follower_id, Follow.following_id.in_(following_ids))}
+    new_ids = sorted(existing_users - already)
+    if new_ids:
+        now = datetime.utcnow()
+        rows = insert_new_rows(db, Follow.__table__, [
+            dict(follower_id=follower_id, following_id=following_id, created_at=now) for following_id in new_ids])
+        # 计数、收件箱和关注图只按本次真正插入的关系更新
+        new_ids = [row["following_id"] for row in rows]
+        if new_ids:
+            db.query(User).filter(User.id.in_(new_ids)).update(
+                {User.follower_count: func.coalesce(User.follower_count, 0) + 1}, synchronize_session=False)
+            db.query(User).filter(User.id == follower_id).update(
+                {User.following_count: func.coalesce(User.following_count, 0) + len(new_ids)},
+                synchronize_session=False)
+            if settings.TIMELINE_ENABLED:
+                backfill_timeline(db, follower_id, new_ids)
+        db.commit()
+        for following_id in new_ids:
+            follow_graph.add_edge(follower_id, following_id)
+    return len(new_ids), sorted(following_ids - set(new_ids))
+
 
+def delete_follow(db: Session, follower_id: int, following_id: int):
+    deleted = db.query(Follow).filter(Follow.follower_id == follower_id,
+                                      Follow.following_id == following_id).delete(synchronize_session=False)
+    if not deleted:
+        db.rollback()
+        return False
+    _update_follow_counts(db, follower_id, following_id, -1)
+    if settings.TIMELINE_ENABLED:
+        remove_from_timeline(db, follower_id, following_id)
+    db.commit()
+    follow_graph.remove_edge(follower_id, following_id)
+    return True
 
-def get_follower_users(db: Session, user_id: int):
-    return db.query(Follow).filter(Follow.following_id == user_id).all()
 
+def _page_follow_users(query, limit: int = 20, cursor=None, columns=None):
+    # 连表一次查出用户，按关注关系 id 倒序（最近关注的在前），cursor 为 (follow_id,)
+    # 行为 (follow_id, User)，传 columns 时为 (follow_id, *columns)
+    if columns:
+        query = query.with_entities(Follow.id, *columns)
+    query = query.order_by(Follow.id.desc())
+    if cursor is not None:
+        query = query.filter(keyset_filter((Follow.id,), cursor))
+    return query.limit(limit).all()
 
-def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-    return db.query(Post).filter(Post.user_id == user_id).order_by(Post.created_at.desc()).offset(skip).limit(
-        limit).all()
 
+def get_following_users(db: Session, user_id: int, limit: int = 20, cursor=None, columns=None):
+    return _page_follow_users(db.query(Follow.id, User).join(User, User.id == Follow.following_id).filter(
+        Follow.follower_id == user_id), limit=limit, cursor=cursor, columns=columns)
 
-def get_following_users_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-    following_ids = db.query(Follow.following_id).filter(Follow.follower_id == user_id).subquery()
-    return db.query(Post).filter(Post.user_id.in_(following_ids)).order_by(Post.created_at.desc()).offset(skip).limit(
-        limit).all()
+
+def get_follower_users(db: Session, user_id: int, limit: int = 20, cursor=None, columns=None):
+    return _page_follow_users(db.query(Follow.id, User).join(User, User.id == Follow.follower_id).filter(
+        Follow.following_id == user_id), limit=limit, cursor=cursor, columns=columns)
+
+
+def _page_posts(query, skip: int = 0, limit: int = 10, cursor=None, columns=None):
+    # cursor 为 (created_at, id)，有游标时走 keyset 分页，不再 offset；传 columns 时返回行元组
+    if columns:
+        query = query.with_entities(*columns)
+    query = query.order_by(Post.created_at.desc(), Post.id.desc())
+    if cursor is not None:
+        return query.filter(keyset_filter((Post.created_at, Post.id), cursor)).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+
+def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10, cursor=None, columns=None):
+    return _page_posts(db.query(Post).filter(Post.user_id == user_id), skip=skip, limit=limit, cursor=cursor,
+                       columns=columns)
+
+
+def get_following_users_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10, cursor=None, columns=None):
+    if settings.TIMELINE_ENABLED:
+        return get_timeline_posts(db, user_id, skip=skip, limit=limit, cursor=cursor, columns=columns)
+    following_ids = db.query(Follow.following_id).filter(Follow.follower_id == user_id).scalar_subquery()
+    return _page_posts(db.query(Post).filter(Post.user_id.in_(following_ids)), skip=skip, limit=limit, cursor=cursor,
+                       columns=columns)
 
 
 def get_user_post_count(db: Session, user_id: int):
@@ -111,17 +380,20 @@ def get_user_post_count(db: Session, user_id: int):
 
 
 def get_following_users_post_count(db: Session, user_id: int):
-    following_ids = db.query(Follow.following_id).filter(Follow.follower_id == user_id).subquery()
+    if settings.TIMELINE_ENABLED:
+        return get_timeline_post_count(db, user_id)
+    following_ids = db.query(Follow.following_id).filter(Follow.follower_id == user_id).scalar_subquery()
     return db.query(Post).filter(Post.user_id.in_(following_ids)).count()
 
 
-def get_specific_following_user_posts(db: Session, follower_id: int, following_id: int, skip: int = 0, limit: int = 10):
+def get_specific_following_user_posts(db: Session, follower_id: int, following_id: int, skip: int = 0, limit: int = 10,
+                                      cursor=None, columns=None):
     # 检查当前用户是否关注了该用户
     follow_relation = db.query(Follow).filter(Follow.follower_id == follower_id,
                                               Follow.following_id == following_id).first()
     if follow_relation:
-        return db.query(Post).filter(Post.user_id == following_id).order_by(Post.created_at.desc()).offset(skip).limit(
-            limit).all()
+        return _page_posts(db.query(Post).filter(Post.user_id == following_id), skip=skip, limit=limit, cursor=cursor,
+                           columns=columns)
     else:
         return None
 
@@ -139,7 +411,9 @@ def get_specific_following_user_post_count(db: Session, follower_id: int, follow
 def create_interest_category(db: Session, category: InterestCategoryCreate):
     db_category = InterestCategory(name=category.name)
     db.add(db_category)
+    bump_catalog_version(db, "interest_categories")
     db.commit()
+    catalog_cache.invalidate("interest_categories")
     db.refresh(db_category)
     return db_category
 
@@ -151,10 +425,22 @@ def get_all_interest_categories(db: Session):
 def create_fan_type(db: Session, fan_type: FanTypeCreate):
     db_fan_type = FanType(name=fan_type.name)
     db.add(db_fan_type)
+    bump_catalog_version(db, "fan_types")
     db.commit()
+    catalog_cache.invalidate("fan_types")
     db.refresh(db_fan_type)
     return db_fan_type
 
 
 def get_all_fan_types(db: Session):
     return db.query(FanType).all()
+
+
+def get_following_ids(db: Session, user_id: int):
+    return [row[0] for row in db.query(Follow.following_id).filter(Follow.follower_id == user_id)]
+
+
+def get_users_by_ids(db: Session, user_ids):
+    """一次 IN 查询取出用户，按传入顺序返回，不存在的跳过"""
+    users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))} if user_ids else {}
+    return [users[user_id] for user_id in user_ids if user_id in users]
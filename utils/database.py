@@ -1,17 +1,257 @@
-from sqlalchemy import create_engine
+import itertools
+import logging
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
 from config import settings
+from utils.metrics import Histogram, instrument_engine
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+READ_YOUR_WRITES_COOKIE = "rw_until"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+logger = logging.getLogger(__name__)
+
+
+class PoolMonitor:
+    """连接池监控：取连接等待时间、使用中连接数、溢出连接数和失效次数"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.checkout_wait = Histogram()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+
+    def attach(self, engine):
+        self.pool = engine.pool
+        engine.pool._monitor = self
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "soft_invalidate", self._on_invalidate)
+        event.listen(engine, "engine_disposed", lambda e: setattr(self, "pool", e.pool))
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.pool.checkedout())
+        self.peak_overflow = max(self.peak_overflow, self.pool.overflow())
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def stats(self):
+        pool = self.pool
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "peak_checked_out": self.peak_checked_out,
+            "peak_overflow": max(self.peak_overflow, 0),
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录每次从池中取连接的等待时间"""
+    _monitor = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self._monitor is not None:
+                self._monitor.checkout_wait.observe(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._monitor = self._monitor
+        return pool
+
+
+def pool_options(url: str):
+    # 内存 SQLite 和 aiosqlite 不使用 QueuePool，不支持连接池大小参数
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and (parsed.database in (None, "", ":memory:")
+                                                  or parsed.get_driver_name() == "aiosqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+pool_monitors = {}
+
+
+def create_monitored_engine(name: str, url: str):
+    options = pool_options(url)
+    if options:
+        options["poolclass"] = InstrumentedQueuePool
+    db_engine = create_engine(url, **options)
+    if options:
+        monitor = PoolMonitor(name)
+        monitor.attach(db_engine)
+        pool_monitors[name] = monitor
+    if settings.METRICS_ENABLED:
+        instrument_engine(db_engine)
+    return db_engine
+
+
+engine = create_monitored_engine("primary", SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+
+class ReplicaRouter:
+    """读请求轮询分发到健康的只读副本；副本全部不可用或刚写入过的客户端走主库"""
+
+    def __init__(self, primary, replica_urls, health_check_interval: float, sticky_seconds: float):
+        self.primary = primary
+        self.replicas = [create_monitored_engine("replica%d" % i, url) for i, url in enumerate(replica_urls)]
+        self.health_check_interval = health_check_interval
+        self.sticky_seconds = sticky_seconds
+        self._healthy = [True] * len(self.replicas)
+        self._counter = itertools.count()
+        self._recent_writes = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    def check_health(self):
+        for i, replica in enumerate(self.replicas):
+            try:
+                with replica.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                healthy = True
+            except Exception:
+                healthy = False
+            if healthy != self._healthy[i]:
+                logger.warning("replica%d is now %s", i, "healthy" if healthy else "unhealthy")
+            self._healthy[i] = healthy
+
+    def _run(self):
+        while not self._stop.wait(self.health_check_interval):
+            self.check_health()
+
+    def start(self):
+        if self.replicas and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-health-check", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def mark_write(self, key: str):
+        now = time.monotonic()
+        self._recent_writes[key] = now + self.sticky_seconds
+        if len(self._recent_writes) > 10000:
+            self._recent_writes = {k: v for k, v in self._recent_writes.items() if v > now}
+
+    def recently_wrote(self, key: str):
+        expires = self._recent_writes.get(key)
+        return expires is not None and expires > time.monotonic()
+
+    def read_engine(self, sticky: bool = False):
+        if not sticky:
+            for _ in range(len(self.replicas)):
+                i = next(self._counter) % len(self.replicas)
+                if self._healthy[i]:
+                    self.replica_reads += 1
+                    return self.replicas[i]
+        self.primary_reads += 1
+        return self.primary
+
+    def stats(self):
+        return {
+            "replicas": len(self.replicas),
+            "healthy": [name for name, healthy in zip(
+                ["replica%d" % i for i in range(len(self.replicas))], self._healthy) if healthy],
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
+
+
+replica_router = ReplicaRouter(engine, settings.REPLICA_DATABASE_URLS, settings.REPLICA_HEALTH_CHECK_INTERVAL,
+                               settings.READ_YOUR_WRITES_SECONDS)
+
+
+def sticky_key(authorization, host):
+    # 登录用户按 token，匿名用户按客户端地址区分
+    return authorization or host or ""
+
+
+class ReadYourWritesMiddleware:
+    """写请求成功后记录客户端并下发 cookie，使其之后短时间内的读请求走主库（多 worker 时依靠 cookie）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or not replica_router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+                client = scope.get("client")
+                replica_router.mark_write(sticky_key(authorization, client[0] if client else None))
+                window = int(replica_router.sticky_seconds)
+                cookie = "%s=%d; Max-Age=%d; Path=/" % (READ_YOUR_WRITES_COOKIE, time.time() + window, window)
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def reads_primary(db):
+    """会话是否读主库；只读副本可能落后于主库，读出的结果不能写入共享的响应缓存"""
+    return db.get_bind() is engine
+
+
+def get_read_db(request: Request):
+    """只读接口使用：有副本时读副本，刚写入过的客户端读主库"""
+    if not replica_router.replicas:
+        yield from get_db()
+        return
+    rw_until = request.cookies.get(READ_YOUR_WRITES_COOKIE, "")
+    sticky = (rw_until.isdigit() and int(rw_until) > time.time()) or replica_router.recently_wrote(
+        sticky_key(request.headers.get("authorization"), request.client.host if request.client else None))
+    db = SessionLocal(bind=replica_router.read_engine(sticky))
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import User, UserInterestCategory, UserFanType
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _to_bitsets(positions, tag_ids, rows: int, words: int):
+    # 标签 id 从 1 开始，第 id-1 位表示拥有该标签
+    bitsets = np.zeros((rows, words), dtype=np.uint64)
+    if len(tag_ids):
+        offsets = tag_ids - 1
+        bits = np.left_shift(np.uint64(1), (offsets % 64).astype(np.uint64))
+        np.bitwise_or.at(bitsets, (positions, offsets // 64), bits)
+    return bitsets
+
+
+def _popcount(bitsets):
+    return np.bitwise_count(bitsets).sum(axis=1, dtype=np.uint16)
+
+
+def _jaccard(bitsets, counts, position):
+    # |A∪B| = |A| + |B| - |A∩B|，每个用户的 |A| 预先算好，只需一次按位与
+    if counts[position] == 0:
+        return np.zeros(len(counts), dtype=np.float32)
+    query = bitsets[position]
+    inter = np.bitwise_count(bitsets[:, 0] & query[0])
+    # 按列逐字累加，比二维 sum(axis=1) 快得多；查询方某个字为 0 时整列跳过
+    if bitsets.shape[1] > 1:
+        inter = inter.astype(np.uint16)
+    for word in np.flatnonzero(query[1:]) + 1:
+        inter += np.bitwise_count(bitsets[:, word] & query[word])
+    return np.divide(inter, counts + counts[position] - inter, dtype=np.float32)
+
+
+def _top_positions(scores, k: int):
+    """取分数大于 0 的前 k 个位置，分数降序、同分按位置（即 user_id）升序
+
+    先在等距抽样上估一个门槛，只对门槛以上的候选排序；分数取值很少、大量并列时
+    argpartition 会退化，这样也能避开。
+    """
+    stride = max(1, len(scores) // 4096)
+    sample = scores[::stride]
+    j = min(len(sample), k // stride + 3)
+    threshold = max(np.partition(sample, len(sample) - j)[len(sample) - j], np.finfo(np.float32).tiny)
+    candidates = np.flatnonzero(scores >= threshold)
+    if len(candidates) < k:
+        candidates = np.flatnonzero(scores > 0)
+    return candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+
+
+class DiscoverIndex:
+    """用户兴趣类别/粉丝类型位图索引，向量化计算重合度并取 top-K
+
+    user_ids 按 id 升序追加（全量加载后只增量拉取 id 更大的新用户），因此可以二分定位；
+    标签变化和极少数乱序提交的注册由定期全量重建修正。
+    """
+
+    def __init__(self, category_weight: float, fan_type_weight: float, refresh_interval: float,
+                 rebuild_interval: float):
+        self.category_weight = category_weight
+        self.fan_type_weight = fan_type_weight
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._user_ids = np.zeros(0, dtype=np.int64)
+        self._categories = np.zeros((0, 1), dtype=np.uint64)
+        self._fan_types = np.zeros((0, 1), dtype=np.uint64)
+        self._category_counts = np.zeros(0, dtype=np.uint16)
+        self._fan_type_counts = np.zeros(0, dtype=np.uint16)
+        self._size = 0
+        self._loaded = False
+        self._stale = False
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self._rebuilding = False
+
+    @property
+    def size(self):
+        return self._size
+
+    def append(self, user_ids, category_pairs, fan_type_pairs):
+        """追加一批用户，user_ids 升序且大于已有 id；pairs 为 (user_id 数组, 标签 id 数组)"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not len(user_ids):
+            return
+        with self._lock:
+            self._categories, self._category_counts = self._append_bitsets(
+                self._categories, self._category_counts, user_ids, *category_pairs)
+            self._fan_types, self._fan_type_counts = self._append_bitsets(
+                self._fan_types, self._fan_type_counts, user_ids, *fan_type_pairs)
+            self._user_ids = self._grow(self._user_ids, self._size + len(user_ids))
+            self._user_ids[self._size:self._size + len(user_ids)] = user_ids
+            self._size += len(user_ids)
+
+    def _append_bitsets(self, bitsets, counts, user_ids, pair_user_ids, tag_ids):
+        pair_user_ids = np.asarray(pair_user_ids, dtype=np.int64)
+        tag_ids = np.asarray(tag_ids, dtype=np.int64)
+        words = max(bitsets.shape[1], int(tag_ids.max() + 63) // 64 if len(tag_ids) else 1)
+        if words > bitsets.shape[1]:
+            bitsets = np.pad(bitsets, ((0, 0), (0, words - bitsets.shape[1])))
+        new_bits = _to_bitsets(np.searchsorted(user_ids, pair_user_ids), tag_ids, len(user_ids), words)
+        bitsets = self._grow(bitsets, self._size + len(user_ids))
+        bitsets[self._size:self._size + len(user_ids)] = new_bits
+        counts = self._grow(counts, self._size + len(user_ids))
+        counts[self._size:self._size + len(user_ids)] = _popcount(new_bits)
+        return bitsets, counts
+
+    @staticmethod
+    def _grow(array, needed: int):
+        # 容量按倍数扩张，摊还追加成本
+        if needed <= len(array):
+            return array
+        grown = np.zeros((max(needed, len(array) * 2),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _load_from_db(self, db: Session, after_id: int):
+        user_ids = np.fromiter((row[0] for row in db.execute(
+            select(User.id).where(User.id > after_id).order_by(User.id).execution_options(yield_per=10000))),
+            dtype=np.int64)
+        categories = db.execute(select(UserInterestCategory.user_id, UserInterestCategory.category_id).where(
+            UserInterestCategory.user_id > after_id)).all()
+        fan_types = db.execute(select(UserFanType.user_id, UserFanType.fan_type_id).where(
+            UserFanType.user_id > after_id)).all()
+        # 只保留本次拉到的用户，避免查询间隙注册的用户只有标签没有行
+        last_id = user_ids[-1] if len(user_ids) else after_id
+
+        def pairs(rows):
+            array = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            array = array[array[:, 0] <= last_id]
+            return array[:, 0], array[:, 1]
+
+        return user_ids, pairs(categories), pairs(fan_types)
+
+    def refresh(self, db: Session):
+        """首次调用全量加载；之后按间隔（或有新注册时）增量拉取新用户，并定期在后台全量重建"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._rebuild(db)
+            return
+        now = time.monotonic()
+        # 增量拉取同一时间只做一次，其他请求直接用现有索引
+        if (self._stale or now - self._refreshed_at >= self.refresh_interval) and self._load_lock.acquire(False):
+            try:
+                self._stale = False
+                self._refreshed_at = now
+                after_id = int(self._user_ids[self._size - 1]) if self._size else 0
+                self.append(*self._load_from_db(db, after_id))
+            finally:
+                self._load_lock.release()
+        if now - self._built_at >= self.rebuild_interval and not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._background_rebuild, name="discover-rebuild", daemon=True).start()
+
+    def _rebuild(self, db: Session):
+        started = time.monotonic()
+        self._stale = False  # 全量加载包含此前注册的用户，不必再增量拉取
+        fresh = DiscoverIndex(self.category_weight, self.fan_type_weight, self.refresh_interval,
+                              self.rebuild_interval)
+        fresh.append(*fresh._load_from_db(db, 0))
+        with self._lock:
+            self._user_ids, self._categories, self._fan_types = fresh._user_ids, fresh._categories, fresh._fan_types
+            self._category_counts, self._fan_type_counts = fresh._category_counts, fresh._fan_type_counts
+            self._size = fresh._size
+            self._loaded = True
+            self._built_at = self._refreshed_at = time.monotonic()
+        logger.info("discover index built: %d users in %.2fs", self._size, time.monotonic() - started)
+
+    def _background_rebuild(self):
+        from utils.database import SessionLocal
+        db = SessionLocal()
+        try:
+            self._rebuild(db)
+        except Exception:
+            logger.exception("discover index rebuild failed")
+        finally:
+            db.close()
+            self._rebuilding = False
+
+    def mark_stale(self):
+        # 本进程有新用户注册，下次查询时立即增量拉取
+        self._stale = True
+
+    def top_k(self, user_id: int, exclude_ids=(), limit: int = 20):
+        """返回 [(user_id, score)]，按分数降序，只包含有重合的用户"""
+        with self._lock:
+            size = self._size
+            user_ids = self._user_ids[:size]
+            categories, category_counts = self._categories[:size], self._category_counts[:size]
+            fan_types, fan_type_counts = self._fan_types[:size], self._fan_type_counts[:size]
+        position = np.searchsorted(user_ids, user_id)
+        if position >= size or user_ids[position] != user_id:
+            return []
+        scores = self.category_weight * _jaccard(categories, category_counts, position)
+        scores += self.fan_type_weight * _jaccard(fan_types, fan_type_counts, position)
+        # 自己和已关注的人置为 -1，user_ids 有序，二分定位
+        exclude = np.append(np.asarray(exclude_ids, dtype=np.int64), user_id)
+        positions = np.minimum(np.searchsorted(user_ids, exclude), size - 1)
+        scores[positions[user_ids[positions] == exclude]] = -1
+        return [(int(user_ids[index]), float(scores[index])) for index in _top_positions(scores, limit)]
+
+    def stats(self):
+        return {
+            "users": self._size,
+            "bytes": int(self._user_ids.nbytes + self._categories.nbytes + self._fan_types.nbytes
+                         + self._category_counts.nbytes + self._fan_type_counts.nbytes),
+            "loaded": self._loaded,
+        }
+
+
+discover_index = DiscoverIndex(settings.DISCOVER_CATEGORY_WEIGHT, settings.DISCOVER_FAN_TYPE_WEIGHT,
+                               settings.DISCOVER_REFRESH_INTERVAL, settings.DISCOVER_REBUILD_INTERVAL)
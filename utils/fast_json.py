@@ -0,0 +1,67 @@
+# 列表接口的快速响应路径（FAST_JSON=true 时启用）：
+# 直接查询需要的列得到行元组，按字段名组装成 dict 后用 orjson 编码，
+# 跳过 response_model 对 ORM 对象的校验与再序列化
+import json
+from fastapi.responses import JSONResponse
+from models import Post, Comment, User
+from schemas import PostResponse, CommentResponse, FollowedUser
+from config import settings
+
+try:
+    import orjson
+except ImportError:  # 没装 orjson 时退回标准库，仍然省掉 Pydantic 校验
+    orjson = None
+
+# 字段顺序取自响应模型，保证两条路径输出的字段一致
+POST_FIELDS = tuple(PostResponse.model_fields)
+COMMENT_FIELDS = tuple(CommentResponse.model_fields)
+USER_FIELDS = tuple(FollowedUser.model_fields)
+
+POST_COLUMNS = tuple(getattr(Post, field) for field in POST_FIELDS)
+COMMENT_COLUMNS = tuple(getattr(Comment, field) for field in COMMENT_FIELDS)
+USER_COLUMNS = tuple(getattr(User, field) for field in USER_FIELDS)
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _default(value):
+    # 与 Pydantic 的 JSON 模式一致，datetime 输出 ISO 8601
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def fast_columns(columns):
+    """FAST_JSON 开启时返回要查询的列，否则返回 None（照常查询 ORM 对象）"""
+    return columns if settings.FAST_JSON else None
+
+
+def rows_to_dicts(rows, fields):
+    # 行元组的最后 len(fields) 列是响应字段，前面可以带排序键等额外列
+    start = -len(fields)
+    return [dict(zip(fields, row[start:])) for row in rows]
+
+
+def list_body(body: dict, key: str, fields, response_model) -> bytes:
+    """与 list_response 输出相同的 JSON，直接返回 bytes，供响应缓存保存"""
+    if settings.FAST_JSON:
+        body[key] = rows_to_dicts(body[key], fields)
+        return dumps(body)
+    return response_model.model_validate(body, from_attributes=True).model_dump_json().encode("utf-8")
+
+
+def list_response(body: dict, key: str, fields):
+    """FAST_JSON 开启时 body[key] 是行元组列表，转成 dict 后直接编码返回；否则原样交给 response_model"""
+    if not settings.FAST_JSON:
+        return body
+    body[key] = rows_to_dicts(body[key], fields)
+    return FastJSONResponse(body)
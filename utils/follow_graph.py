@@ -0,0 +1,248 @@
+import logging
+import threading
+import time
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Follow
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+OUT, IN = 0, 1  # 关注方向：OUT 为我关注的人，IN 为关注我的人
+
+
+def build_csr(src, dst, size: int):
+    """由边数组构建 CSR：indptr[u]:indptr[u+1] 是 u 的邻居区间，区间内按 id 升序"""
+    if size * size < 2 ** 63:
+        order = np.argsort(src * size + dst, kind="stable")
+    else:
+        order = np.lexsort((dst, src))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=size), out=indptr[1:])
+    dtype = np.int32 if size < 2 ** 31 else np.int64
+    return indptr, dst[order].astype(dtype)
+
+
+def gather(indptr, indices, nodes):
+    """一次取出多个节点的邻居并拼接，不做 Python 循环"""
+    nodes = nodes[nodes < len(indptr) - 1]
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    ends = np.cumsum(lengths)
+    return indices[np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)]
+
+
+class _Delta:
+    """加载之后的增删边，按节点记录，读时叠加到 CSR 上"""
+
+    def __init__(self):
+        self.added = ({}, {})
+        self.removed = ({}, {})
+        self.size = 0
+
+    def add(self, follower_id: int, following_id: int):
+        for direction, node, neighbor in ((OUT, follower_id, following_id), (IN, following_id, follower_id)):
+            self.added[direction].setdefault(node, set()).add(neighbor)
+            self.removed[direction].get(node, set()).discard(neighbor)
+        self.size += 1
+
+    def remove(self, follower_id: int, following_id: int):
+        for direction, node, neighbor in ((OUT, follower_id, following_id), (IN, following_id, follower_id)):
+            self.removed[direction].setdefault(node, set()).add(neighbor)
+            self.added[direction].get(node, set()).discard(neighbor)
+        self.size += 1
+
+    def apply(self, direction: int, node: int, neighbors):
+        added = self.added[direction].get(node)
+        removed = self.removed[direction].get(node)
+        if added:
+            neighbors = np.union1d(neighbors, np.fromiter(added, dtype=neighbors.dtype, count=len(added)))
+        if removed:
+            neighbors = np.setdiff1d(neighbors, np.fromiter(removed, dtype=neighbors.dtype, count=len(removed)),
+                                     assume_unique=True)
+        return neighbors
+
+    def touched(self, direction: int):
+        return self.added[direction].keys() | self.removed[direction].keys()
+
+
+class FollowGraph:
+    """关注关系的 CSR 邻接索引（正反两个方向），支撑互关、回关和二度推荐
+
+    全量从 follows 表加载；本进程的关注/取关即时记入增量，其他 worker 新增的关注按 Follow.id
+    水位增量拉取，取关与增量过多时由后台全量重建合并。
+    """
+
+    def __init__(self, refresh_interval: float, rebuild_interval: float, compact_threshold: int):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        empty = (np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        self._csr = (empty, empty)
+        self._deltas = [_Delta()]
+        self._edges = 0
+        self._watermark = 0
+        self._loaded = False
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self._rebuilding = False
+        self._thread = None
+
+    def begin_load(self):
+        """开始一次全量加载：在读取边之前调用，之后记下的增删边记入新的增量，加载完成后保留"""
+        with self._lock:
+            marker = _Delta()
+            self._deltas.append(marker)
+            return marker
+
+    def load_edges(self, src, dst, watermark: int = 0, since=None):
+        """由边数组整体替换 CSR
+
+        since 为读取边数组之前 begin_load() 的返回值，从它开始的增量保留，更早的已包含在边数组中而丢弃；
+        不传时保留全部增量，重放到新的 CSR 上结果不变，只是不回收内存。
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        size = int(max(src.max(), dst.max())) + 1 if len(src) else 1
+        csr = (build_csr(src, dst, size), build_csr(dst, src, size))
+        with self._lock:
+            self._csr = csr
+            if since is not None:
+                self._deltas = self._deltas[self._deltas.index(since):]
+            self._edges = len(src)
+            self._watermark = max(self._watermark, watermark)
+            self._loaded = True
+            self._built_at = self._refreshed_at = time.monotonic()
+
+    def _load_from_db(self, db: Session):
+        started = time.monotonic()
+        marker = self.begin_load()
+        result = db.execute(select(Follow.id, Follow.follower_id, Follow.following_id).execution_options(
+            yield_per=100000))
+        chunks = [np.array(partition, dtype=np.int64).reshape(-1, 3) for partition in result.partitions()]
+        edges = np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype=np.int64)
+        self.load_edges(edges[:, 1], edges[:, 2], int(edges[:, 0].max()) if len(edges) else 0, marker)
+        logger.info("follow graph built: %d edges in %.2fs", len(edges), time.monotonic() - started)
+
+    def refresh(self, db: Session):
+        """首次调用全量加载；之后按间隔增量拉取其他 worker 新增的关注，定期或增量过多时后台重建"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load_from_db(db)
+            return
+        now = time.monotonic()
+        if now - self._refreshed_at >= self.refresh_interval and self._load_lock.acquire(False):
+            try:
+                self._refreshed_at = now
+                rows = db.query(Follow.id, Follow.follower_id, Follow.following_id).filter(
+                    Follow.id > self._watermark).order_by(Follow.id).all()
+                with self._lock:
+                    for follow_id, follower_id, following_id in rows:
+                        self._deltas[-1].add(follower_id, following_id)
+                        self._watermark = follow_id
+            finally:
+                self._load_lock.release()
+        pending = sum(delta.size for delta in self._deltas)
+        if (now - self._built_at >= self.rebuild_interval or pending >= self.compact_threshold) \
+                and not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._background_load, name="follow-graph-rebuild", daemon=True).start()
+
+    def _background_load(self):
+        from utils.database import SessionLocal
+        db = SessionLocal()
+        try:
+            with self._load_lock:
+                self._load_from_db(db)
+        except Exception:
+            logger.exception("follow graph load failed")
+        finally:
+            db.close()
+            self._rebuilding = False
+
+    def start(self):
+        # 启动时在后台预加载，首个请求若先到会在 refresh 里等待加载完成
+        if self._thread is None and not self._loaded:
+            self._rebuilding = True
+            self._thread = threading.Thread(target=self._background_load, name="follow-graph-load", daemon=True)
+            self._thread.start()
+
+    def add_edge(self, follower_id: int, following_id: int):
+        with self._lock:
+            self._deltas[-1].add(follower_id, following_id)
+
+    def remove_edge(self, follower_id: int, following_id: int):
+        with self._lock:
+            self._deltas[-1].remove(follower_id, following_id)
+
+    def _neighbors(self, direction: int, node: int):
+        with self._lock:
+            indptr, indices = self._csr[direction]
+            deltas = list(self._deltas)
+        if node < len(indptr) - 1:
+            neighbors = indices[indptr[node]:indptr[node + 1]]
+        else:
+            neighbors = indices[:0]
+        for delta in deltas:
+            neighbors = delta.apply(direction, node, neighbors)
+        return neighbors
+
+    def following(self, user_id: int):
+        return self._neighbors(OUT, user_id)
+
+    def followers(self, user_id: int):
+        return self._neighbors(IN, user_id)
+
+    def mutuals(self, user_id: int):
+        """互相关注的用户，id 升序"""
+        return np.intersect1d(self.following(user_id), self.followers(user_id), assume_unique=True)
+
+    def follow_backs(self, user_id: int):
+        """关注了我、我还没有回关的用户，id 升序"""
+        return np.setdiff1d(self.followers(user_id), self.following(user_id), assume_unique=True)
+
+    def followed_by_following(self, user_id: int, target_id: int):
+        """我关注的人里哪些也关注了 target，id 升序"""
+        return np.intersect1d(self.following(user_id), self.followers(target_id), assume_unique=True)
+
+    def suggestions(self, user_id: int, limit: int = 20, max_intermediate: int = 2000):
+        """二度推荐：我关注的人所关注的人，按路径数降序、id 升序，返回 [(user_id, path_count)]"""
+        following = self.following(user_id)
+        intermediate = following
+        if len(intermediate) > max_intermediate:
+            # 关注数特别多时等距抽样中间节点，限制单次计算量
+            intermediate = intermediate[np.linspace(0, len(intermediate) - 1, max_intermediate).astype(np.int64)]
+        with self._lock:
+            indptr, indices = self._csr[OUT]
+            touched = set().union(*(delta.touched(OUT) for delta in self._deltas))
+        # 有增量的中间节点单独合并，其余直接从 CSR 批量取
+        changed = np.isin(intermediate, np.fromiter(touched, dtype=np.int64, count=len(touched)))
+        parts = [gather(indptr, indices, intermediate[~changed].astype(np.int64))]
+        parts += [self.following(int(node)) for node in intermediate[changed]]
+        candidates, counts = np.unique(np.concatenate(parts), return_counts=True)
+        keep = ~np.isin(candidates, following, assume_unique=True) & (candidates != user_id)
+        candidates, counts = candidates[keep], counts[keep]
+        top = np.lexsort((candidates, -counts))[:limit]
+        return [(int(candidates[i]), int(counts[i])) for i in top]
+
+    def stats(self):
+        with self._lock:
+            arrays = [array for csr in self._csr for array in csr]
+            pending = sum(delta.size for delta in self._deltas)
+        csr_bytes = int(sum(array.nbytes for array in arrays))
+        return {
+            "loaded": self._loaded,
+            "edges": self._edges,
+            "pending_changes": pending,
+            "watermark": self._watermark,
+            "csr_bytes": csr_bytes,
+            "bytes_per_edge": csr_bytes / self._edges if self._edges else 0.0,
+        }
+
+
+follow_graph = FollowGraph(settings.FOLLOW_GRAPH_REFRESH_INTERVAL, settings.FOLLOW_GRAPH_REBUILD_INTERVAL,
+                           settings.FOLLOW_GRAPH_COMPACT_THRESHOLD)
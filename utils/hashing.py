@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import settings
+
+_pwd_context = None
+
+
+def pwd_context():
+    # passlib 的导入和 CryptContext 初始化较慢，第一次用到时再做（哈希子进程里也是各自初始化）
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+    return _pwd_context
+
+
+class HashingOverloaded(Exception):
+    """哈希进程池排队已满"""
+
+
+def hash_password(password: str):
+    return pwd_context().hash(password)
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password, hashed_password):
+    # 返回 (是否通过, 新哈希)；哈希轮数与当前配置不一致时新哈希不为空
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class HashingPool:
+    """bcrypt 专用进程池，不占用处理请求的线程池；排队超过上限时快速失败"""
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def start(self):
+        # 预先拉起子进程，避免第一次登录承担启动开销；应在启动其他后台线程之前调用
+        executor = self._get_executor()
+        for future in [executor.submit(abs, 0) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._inflight >= self.queue_limit:
+                self.rejected += 1
+                raise HashingOverloaded()
+            self._inflight += 1
+        try:
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                self.completed += 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "inflight": self._inflight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+hashing_pool = HashingPool(settings.HASH_WORKERS, settings.HASH_QUEUE_LIMIT)
@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from sqlalchemy import update, select, func, bindparam
+from models import Post, Like
+from utils.database import engine
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+posts_table = Post.__table__
+likes_table = Like.__table__
+
+
+class LikeCounterBuffer:
+    """点赞计数的写缓冲：按帖子合并增量，定时或攒够一定数量后批量写回 posts.like_count"""
+
+    def __init__(self, bind, flush_interval: float, flush_threshold: int):
+        self.bind = bind
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = {}
+        self._inflight = {}  # 已从 _pending 取出、尚未提交的增量，读计数时仍要算上
+        self._pending_total = 0
+        self._oldest = None  # 最早一次未写回增量的时间
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_increments = 0
+        self.flush_errors = 0
+        self.last_flush_duration = 0.0
+        self.last_flush_lag = 0.0
+
+    def add(self, post_id: int, delta: int = 1):
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + delta
+            self._pending_total += delta
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._pending_total >= self.flush_threshold
+        if full:
+            self._wake.set()
+
+    def pending(self, post_id: int):
+        with self._lock:
+            return self._pending.get(post_id, 0) + self._inflight.get(post_id, 0)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                oldest, self._oldest = self._oldest, None
+                self._pending_total = 0
+                self._inflight = pending
+            if not pending:
+                return 0
+            started = time.monotonic()
+            # 按 post_id 排序写入，避免多个 worker 同时刷新时互相死锁
+            rows = [{"b_id": post_id, "b_delta": delta} for post_id, delta in sorted(pending.items())]
+            stmt = update(posts_table).where(posts_table.c.id == bindparam("b_id")).values(
+                like_count=func.coalesce(posts_table.c.like_count, 0) + bindparam("b_delta"))
+            try:
+                with self.bind.begin() as conn:
+                    conn.execute(stmt, rows)
+            except Exception:
+                self.flush_errors += 1
+                with self._lock:
+                    self._inflight = {}
+                    for post_id, delta in pending.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + delta
+                        self._pending_total += delta
+                    if self._oldest is None or oldest < self._oldest:
+                        self._oldest = oldest
+                raise
+            with self._lock:
+                self._inflight = {}
+            finished = time.monotonic()
+            self.flushes += 1
+            self.flushed_increments += sum(pending.values())
+            self.last_flush_duration = finished - started
+            self.last_flush_lag = finished - oldest
+            return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("like counter flush failed")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="like-counter-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending_posts = len(self._pending)
+            pending_increments = self._pending_total
+            lag = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+        return {
+            "pending_posts": pending_posts,
+            "pending_increments": pending_increments,
+            "flush_lag_seconds": lag,
+            "last_flush_lag_seconds": self.last_flush_lag,
+            "last_flush_duration_seconds": self.last_flush_duration,
+            "flushes": self.flushes,
+            "flushed_increments": self.flushed_increments,
+            "flush_errors": self.flush_errors,
+        }
+
+
+like_buffer = LikeCounterBuffer(engine, settings.LIKE_FLUSH_INTERVAL, settings.LIKE_FLUSH_THRESHOLD)
+
+
+def reconcile_like_counts(bind=engine, batch_size: int = 10000):
+    """按 likes 表重新计算 posts.like_count，分批按 id 区间更新
+
+    本进程缓冲中的增量会先写回，但校正期间新写入的点赞、以及其他 worker 尚未写回的增量，
+    已经算进 likes 表又会在刷新时再加一次，计数会偏大；只有在暂停点赞写入时执行才是精确的，
+    否则偏差要等下一次校正才能消除，建议在低峰期执行。
+    """
+    like_buffer.flush()
+    like_count = select(func.count(likes_table.c.id)).where(
+        likes_table.c.post_id == posts_table.c.id).scalar_subquery()
+    with bind.connect() as conn:
+        max_id = conn.execute(select(func.max(posts_table.c.id))).scalar() or 0
+    updated = 0
+    for start in range(0, max_id, batch_size):
+        with bind.begin() as conn:
+            result = conn.execute(update(posts_table).where(
+                posts_table.c.id > start, posts_table.c.id <= start + batch_size).values(like_count=like_count))
+            updated += result.rowcount
+    return updated
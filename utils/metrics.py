@@ -0,0 +1,238 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from sqlalchemy import event
+from config import settings
+from utils.query_budget import check_request
+
+# 默认耗时分桶，单位秒
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """固定分桶的直方图，线程安全"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self._lock = threading.Lock()
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """返回累计分桶计数 {上界: 次数}，与 Prometheus 的 le 语义一致"""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum, total_count = self.sum, self.count
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+        return {"buckets": cumulative, "sum": total_sum, "count": total_count}
+
+
+# 每个请求一次查询数的分桶
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+
+class LabeledHistogram:
+    """按标签取值分组的一组直方图"""
+
+    def __init__(self, labels, buckets=DEFAULT_BUCKETS):
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value: float):
+        child = self._children.get(label_values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(label_values, Histogram(self.buckets))
+        child.observe(value)
+
+    def items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class RequestStats:
+    """单个请求内的数据库查询次数、耗时和各语句的执行次数，由 MetricsMiddleware 放进 contextvar"""
+    __slots__ = ("scope", "queries", "db_time", "statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+
+    @property
+    def route(self):
+        return route_template(self.scope)
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def route_template(scope):
+    # 用路由模板（/post/{post_id}/comments）而不是实际路径做标签，避免标签取值无限增长
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class Metrics:
+    """请求延迟、每请求查询数和数据库耗时的汇总，以及各组件 stats() 的采集，输出 Prometheus 文本格式"""
+
+    def __init__(self, prefix: str = "fkemo"):
+        self.prefix = prefix
+        self.request_duration = LabeledHistogram(("method", "route", "status"))
+        self.request_queries = LabeledHistogram(("route",), QUERY_COUNT_BUCKETS)
+        self.query_duration = LabeledHistogram(("route",))
+        self.slow_queries = 0
+        self.in_flight = 0
+        self._collectors = {}
+
+    def register(self, name: str, collect, label: str = None):
+        """注册组件的 stats()；label 不为空时 stats() 返回 {标签值: 指标 dict}"""
+        self._collectors[name] = (collect, label)
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        self.request_duration.observe((method, route, str(status)), duration)
+        self.request_queries.observe((route,), stats.queries)
+
+    def observe_query(self, duration: float, statement: str):
+        stats = current_request.get()
+        route = "background" if stats is None else stats.route
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += duration
+            if settings.QUERY_BUDGET_MODE != "off":
+                stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        self.query_duration.observe((route,), duration)
+        if duration >= settings.SLOW_QUERY_SECONDS:
+            self.slow_queries += 1
+            logger.warning("slow query %.3fs route=%s: %s", duration, route,
+                           " ".join(statement.split())[:settings.SLOW_QUERY_LOG_LENGTH])
+
+    def render(self) -> str:
+        lines = []
+        self._render_histogram(lines, "http_request_duration_seconds", "HTTP 请求耗时", self.request_duration)
+        self._render_histogram(lines, "http_request_db_queries", "每个请求的数据库查询数", self.request_queries)
+        self._render_histogram(lines, "db_query_duration_seconds", "数据库语句耗时", self.query_duration)
+        self._render_value(lines, "db_slow_queries_total", "counter", {(): self.slow_queries})
+        self._render_value(lines, "http_requests_in_flight", "gauge", {(): self.in_flight})
+        for name, (collect, label) in self._collectors.items():
+            try:
+                stats = collect()
+            except Exception:
+                logger.exception("metrics collector %s failed", name)
+                continue
+            groups = stats.items() if label else [(None, stats)]
+            values = {}
+            for label_value, group in groups:
+                labels = ((label, label_value),) if label else ()
+                for key, value in group.items():
+                    values.setdefault(key, {})[labels] = value
+            for key, by_labels in values.items():
+                metric = "%s_%s" % (name, key)
+                sample = next(iter(by_labels.values()))
+                if isinstance(sample, dict) and "buckets" in sample:
+                    self._render_snapshots(lines, metric, by_labels)
+                elif isinstance(sample, (int, float)):
+                    self._render_value(lines, metric, "gauge", by_labels)
+        return "\n".join(lines) + "\n"
+
+    def _render_value(self, lines, name, kind, by_labels):
+        name = "%s_%s" % (self.prefix, name)
+        lines.append("# TYPE %s %s" % (name, kind))
+        for labels, value in by_labels.items():
+            lines.append("%s%s %s" % (name, _format_labels(labels), float(value)))
+
+    def _render_histogram(self, lines, name, help_text, histogram: LabeledHistogram):
+        lines.append("# HELP %s_%s %s" % (self.prefix, name, help_text))
+        self._render_snapshots(lines, name, {tuple(zip(histogram.labels, label_values)): child.snapshot()
+                                             for label_values, child in histogram.items()})
+
+    def _render_snapshots(self, lines, name, by_labels):
+        name = "%s_%s" % (self.prefix, name)
+        lines.append("# TYPE %s histogram" % name)
+        for labels, snapshot in by_labels.items():
+            for bound, count in snapshot["buckets"].items():
+                lines.append("%s_bucket%s %d" % (name, _format_labels(labels + (("le", bound),)), count))
+            lines.append("%s_sum%s %s" % (name, _format_labels(labels), float(snapshot["sum"])))
+            lines.append("%s_count%s %d" % (name, _format_labels(labels), snapshot["count"]))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                             for key, value in labels)
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件：记录每个请求的耗时、查询数，并在响应头里附上 Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    timing = 'app;dur=%.1f, db;dur=%.1f;desc="%d queries"' % (
+                        (time.perf_counter() - started) * 1000, stats.db_time * 1000, stats.queries)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.in_flight -= 1
+            current_request.reset(token)
+            metrics.observe_request(scope["method"], stats.route, status_code, time.perf_counter() - started, stats)
+        # 请求正常结束才检查预算；raise 模式下响应已发出，异常只用于让测试失败
+        check_request(stats.route, scope.get("endpoint"), stats.queries, stats.statements)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        metrics.observe_query(time.perf_counter() - started, statement)
+
+
+def instrument_engine(engine):
+    """给引擎挂上语句耗时统计；异步引擎传 async_engine.sync_engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,61 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(*values):
+    """把排序键编码成不透明的游标字符串"""
+    parts = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(parts, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types):
+    """按 types 还原游标中的排序键，游标不合法时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        parts = json.loads(raw)
+        if not isinstance(parts, list) or len(parts) != len(types):
+            raise ValueError("Invalid cursor")
+        return tuple(datetime.fromisoformat(part) if type_ is datetime else type_(part)
+                     for type_, part in zip(types, parts))
+    except (binascii.Error, UnicodeDecodeError, TypeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_cursor(cursor: Optional[str], *types):
+    """接口层使用：没有游标返回 None，游标不合法返回 400"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, *types)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def keyset_filter(columns, values, descending=True):
+    # (a, b) < (x, y) 展开成 a < x OR (a = x AND b < y)，这样 MySQL 能走复合索引的范围扫描
+    conditions = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        compare = column < value if descending else column > value
+        conditions.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], compare))
+    return or_(*conditions)
+
+
+def paginate(rows, page_size: int, key):
+    """rows 多查一条用来判断是否还有下一页，返回 (当前页, next_cursor)"""
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(*key(rows[-1]))
+    return rows, None
+
+
+def paginate_posts(posts, page_size: int):
+    return paginate(posts, page_size, key=lambda p: (p.created_at, p.id))
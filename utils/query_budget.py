@@ -0,0 +1,87 @@
+# 查询预算：每个接口声明单次请求最多执行的语句数，并检测同一形状的语句在一次请求内反复执行（N+1）
+# QUERY_BUDGET_MODE=raise 用于测试和 scripts/check_query_budgets.py，超出时抛异常；
+# log 用于线上，只记 warning 日志并计入 /metrics；off 关闭
+import logging
+import re
+import threading
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# IN (?, ?, ?) / VALUES (?, ?), (?, ?) 这类随参数个数变化的部分折叠掉，数字字面量替换成 ?
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)")
+_REPEATED_TUPLES = re.compile(r"(\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries: int, allow_repeats: bool = False):
+    """声明接口单次请求的语句数上限；allow_repeats 为 True 时不做 N+1 检测
+
+    放在路由装饰器下面，例如：
+        @app.get("/me/following")
+        @query_budget(3)
+        def get_following(...): ...
+    """
+
+    def decorator(endpoint):
+        endpoint.query_budget = max_queries
+        endpoint.query_budget_allow_repeats = allow_repeats
+        return endpoint
+
+    return decorator
+
+
+def statement_shape(statement: str) -> str:
+    shape = _PLACEHOLDER_LIST.sub("(?)", " ".join(statement.split()))
+    return _NUMBER.sub("?", _REPEATED_TUPLES.sub(r"\1", shape))
+
+
+class BudgetViolations:
+    """按路由累计的超预算次数和 N+1 次数，注册到 /metrics"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, route: str, kind: str):
+        with self._lock:
+            counts = self._counts.setdefault(route, {"exceeded": 0, "repeated": 0})
+            counts[kind] += 1
+
+    def stats(self):
+        with self._lock:
+            return {route: dict(counts) for route, counts in self._counts.items()}
+
+
+violations = BudgetViolations()
+
+
+def check_request(route: str, endpoint, queries: int, statements: dict):
+    """请求结束时检查语句数和重复语句；statements 为 {语句: 执行次数}"""
+    if settings.QUERY_BUDGET_MODE == "off":
+        return
+    problems = []
+    budget = getattr(endpoint, "query_budget", None)
+    if budget is not None and queries > budget:
+        violations.add(route, "exceeded")
+        problems.append("%d queries, budget %d" % (queries, budget))
+    if not getattr(endpoint, "query_budget_allow_repeats", False):
+        shapes = {}
+        for statement, count in statements.items():
+            shape = statement_shape(statement)
+            shapes[shape] = shapes.get(shape, 0) + count
+        for shape, count in shapes.items():
+            if count >= settings.QUERY_REPEAT_THRESHOLD:
+                violations.add(route, "repeated")
+                problems.append("statement executed %d times (N+1?): %s" % (
+                    count, shape[:settings.SLOW_QUERY_LOG_LENGTH]))
+    if not problems:
+        return
+    message = "query budget violation on %s: %s" % (route, "; ".join(problems))
+    if settings.QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
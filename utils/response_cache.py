@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+
+
+class MemoryBackend:
+    """进程内的 LRU 存储，按字节数限制容量
+
+    后端只需要实现 get(key) / set(key, value, ttl=None) / delete(key)，value 为 bytes；
+    多 worker 共享缓存时换成实现同样接口的外部存储（如 Redis 客户端的薄封装），测试里用本类代替。
+    """
+
+    ENTRY_OVERHEAD = 64  # 每条的 key、时间戳等额外开销的估计值
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _size(self, key: str, value: bytes):
+        return len(key) + len(value) + self.ENTRY_OVERHEAD
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._size(key, entry[0])
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "evictions": self.evictions}
+
+
+class ResponseCache:
+    """按帖子缓存公开接口的响应体和强 ETag，帖子有新评论/点赞时整体失效
+
+    每个帖子有一个随机的代号（generation），缓存键包含代号；写入时换一个新代号，
+    旧条目不再被命中，随 LRU 淘汰。先读代号再查库，查库期间发生的写入不会留下过期条目。
+    """
+
+    def __init__(self, backend, ttl: float = None, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def _generation(self, post_id: int):
+        generation_key = "gen:%d" % post_id
+        generation = self.backend.get(generation_key)
+        if generation is None:
+            # 代号丢失（被淘汰或首次访问）时生成新的，不会与旧条目的键冲突
+            generation = os.urandom(6).hex().encode()
+            self.backend.set(generation_key, generation)
+        return generation.decode()
+
+    def key(self, kind: str, post_id: int, *variant):
+        return "%s:%d:%s:%s" % (kind, post_id, self._generation(post_id), ":".join(map(str, variant)))
+
+    def get(self, key: str):
+        """返回 (body, etag)，未命中返回 None"""
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, body = value.split(b"\n", 1)
+        return body, etag.decode()
+
+    def set(self, key: str, body: bytes, store: bool = True):
+        """返回 (body, etag)；store 为 False 时只计算 ETag，不写入缓存"""
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.enabled and store:
+            self.backend.set(key, etag.encode() + b"\n" + body, self.ttl)
+        return body, etag
+
+    def invalidate(self, post_id: int):
+        """在写入提交之后调用"""
+        if self.enabled:
+            self.backend.set("gen:%d" % post_id, os.urandom(6).hex().encode())
+            self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        stats = {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified,
+                 "invalidations": self.invalidations, "hit_ratio": self.hits / total if total else 0.0}
+        if hasattr(self.backend, "stats"):
+            stats.update(self.backend.stats())
+        return stats
+
+
+response_cache = ResponseCache(MemoryBackend(settings.RESPONSE_CACHE_MAX_BYTES), settings.RESPONSE_CACHE_TTL,
+                               settings.RESPONSE_CACHE_ENABLED)
@@ -0,0 +1,124 @@
+# 库表结构的初始化与迁移，只由 scripts/migrate_schema.py（部署时执行一次）调用；
+# worker 启动时只读 schema_version 一行确认结构已是当前版本，不再逐表检查或执行 DDL
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text, select, update, func, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateColumn
+import models
+from utils.catalog_cache import seed_catalog_versions
+from utils.timeline import mark_pull_authors
+from utils.trending import fill_expires_at
+from models import SchemaVersion, Follow, Like
+
+logger = logging.getLogger(__name__)
+
+# models 中增加表、列或索引时加一，并确认 bootstrap 能把旧库补齐
+SCHEMA_VERSION = 5
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def write_counts(engine, table, column, group_column, batch_size: int = 10000, progress=None):
+    """按 group_column 分组计数后写回 table.column，没有出现的行置 0
+
+    不用关联子查询逐行 count：大表上是平方级的；一次 GROUP BY 加分批 executemany 与数据量成线性。
+    """
+    with engine.begin() as conn:
+        conn.execute(update(table).values({column: 0}))
+        counts = conn.execute(select(group_column, func.count()).group_by(group_column))
+        stmt = update(table).where(table.c.id == bindparam("row_id")).values({column: bindparam("value")})
+        while True:
+            batch = [dict(row_id=key, value=value) for key, value in counts.fetchmany(batch_size)]
+            if not batch:
+                break
+            conn.execute(stmt, batch)
+            if progress is not None:
+                progress.add(len(batch))
+
+
+def _count_backfill(group_column):
+    return lambda engine, table, column: write_counts(engine, table, column, group_column)
+
+
+# 由其他表推导出的列：给旧库补上这些列后按来源重算，否则新列为 NULL（计数为 0、粉丝数判断失效）
+BACKFILLS = {
+    ("posts", "like_count"): _count_backfill(Like.__table__.c.post_id),
+    ("users", "follower_count"): _count_backfill(Follow.__table__.c.following_id),
+    ("users", "following_count"): _count_backfill(Follow.__table__.c.follower_id),
+    ("users", "timeline_pull"): lambda engine, table, column: mark_pull_authors(engine),  # 在 follower_count 之后
+    ("post_scores", "expires_at"): lambda engine, table, column: fill_expires_at(engine),
+}
+
+
+def current_version(engine):
+    """读取库中记录的结构版本，表不存在时返回 None"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version FROM schema_version WHERE id = 1")).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+def check_schema(engine):
+    # 库的版本可以比代码新（先迁移再滚动发布），不能比代码旧
+    version = current_version(engine)
+    if version is None or version < SCHEMA_VERSION:
+        raise SchemaOutdated("database schema version is %s, code requires %d; run python -m scripts.migrate_schema"
+                             % (version, SCHEMA_VERSION))
+    return version
+
+
+def _add_missing_columns(conn, inspector, table):
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name not in existing:
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text("ALTER TABLE %s ADD COLUMN %s" % (table.name, ddl)))
+            logger.warning("added column %s.%s", table.name, column.name)
+            added.append(column)
+    return added
+
+
+def _add_missing_indexes(conn, inspector, table):
+    existing = {index["name"] for index in inspector.get_indexes(table.name)}
+    existing |= {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+            logger.warning("created index %s on %s", index.name, table.name)
+
+
+def bootstrap(engine):
+    """建表，并给已有的表补上缺少的列和索引，最后写入结构版本；可重复执行
+
+    只做加法：不删除、不修改已有的列和索引。唯一约束只能随建表创建，已有表上需要唯一性时用唯一索引。
+    补上的冗余列（BACKFILLS）按来源表重算，应在 worker 写入之前执行。
+    """
+    models.Base.metadata.create_all(bind=engine)
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in models.Base.metadata.sorted_tables:
+            added += _add_missing_columns(conn, inspector, table)
+            _add_missing_indexes(conn, inspector, table)
+    for column in added:
+        backfill = BACKFILLS.get((column.table.name, column.name))
+        if backfill is not None:
+            backfill(engine, column.table, column.name)
+            logger.warning("backfilled %s.%s", column.table.name, column.name)
+    with engine.begin() as conn:
+        seed_catalog_versions(conn)
+        row = conn.execute(SchemaVersion.__table__.select().where(SchemaVersion.id == 1)).first()
+        if row is None:
+            conn.execute(SchemaVersion.__table__.insert().values(id=1, version=SCHEMA_VERSION,
+                                                                  updated_at=datetime.utcnow()))
+        elif row.version < SCHEMA_VERSION:
+            conn.execute(SchemaVersion.__table__.update().where(SchemaVersion.id == 1).values(
+                version=SCHEMA_VERSION, updated_at=datetime.utcnow()))
+        elif row.version > SCHEMA_VERSION:
+            logger.warning("database schema version %d is newer than code version %d", row.version, SCHEMA_VERSION)
+    return max(SCHEMA_VERSION, row.version if row is not None else 0)
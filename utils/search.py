@@ -0,0 +1,331 @@
+import logging
+import threading
+import time
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Post
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SHIFT = 21  # Unicode 码位不超过 21 位，两个码位拼成一个 bigram 词码
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 不算作文字的非 ASCII 区间：Latin-1 标点、通用标点、CJK 标点、全角标点
+PUNCTUATION_RANGES = ((0x80, 0xBF), (0x2000, 0x206F), (0x3000, 0x303F), (0xFE30, 0xFE4F), (0xFF00, 0xFF0F),
+                      (0xFF1A, 0xFF20), (0xFF3B, 0xFF40), (0xFF5B, 0xFF65))
+
+
+def _word_mask(codes):
+    mask = ((codes >= ord("0")) & (codes <= ord("9"))) | ((codes >= ord("a")) & (codes <= ord("z"))) | (codes >= 0x80)
+    for low, high in PUNCTUATION_RANGES:
+        mask &= ~((codes >= low) & (codes <= high))
+    return mask
+
+
+def tokenize(texts):
+    """与 MySQL ngram 全文解析器一致：按非文字字符切成片段，片段内相邻两个字符为一个词，单字片段取单字
+
+    中文不需要分词词典；英文、数字同样按两个字符切分。整批文本一次转成码位数组处理，
+    返回 (doc, code) 两个等长数组，表示第 doc 篇文本含有词 code（出现几次就重复几次）。
+    """
+    joined = "\x00".join(text.replace("\x00", "") for text in texts).lower()
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    docs = np.cumsum(codes == 0)  # 分隔符不是文字，也不会进入任何词
+    word = _word_mask(codes)
+    pair = word[:-1] & word[1:]
+    single = word.copy()
+    single[1:] &= ~word[:-1]
+    single[:-1] &= ~word[1:]
+    bigrams = (codes[:-1][pair] << SHIFT) | codes[1:][pair]
+    return np.concatenate([docs[:-1][pair], docs[single]]), np.concatenate([bigrams, codes[single]])
+
+
+def _lookup(base, delta, index):
+    """按文档下标取值：前 len(base) 个在基础数组里，之后的在增量数组里"""
+    if not len(delta):
+        return base[index]
+    if not len(base):
+        return delta[index]
+    in_base = index < len(base)
+    return np.where(in_base, base[np.where(in_base, index, 0)], delta[np.where(in_base, 0, index - len(base))])
+
+
+class _Index:
+    """不可变的倒排索引：词码有序数组 + CSR 倒排表（文档下标升序，带词频）"""
+
+    def __init__(self, post_ids, lengths, vocab, indptr, docs, tfs):
+        self.post_ids = post_ids
+        self.lengths = lengths
+        self.vocab = vocab
+        self.indptr = indptr
+        self.docs = docs
+        self.tfs = tfs
+        self.total_length = int(lengths.sum())
+
+    @classmethod
+    def build(cls, batches):
+        """batches 产出 (post_ids, texts)，post_id 需整体升序"""
+        id_chunks, length_chunks, posting_chunks = [], [], []
+        offset = 0
+        for post_ids, texts in batches:
+            docs, codes = tokenize(texts)
+            # 批内先按 (词, 文档) 去重计数，批内文档数不超过 2**20，拼成一个键不会溢出
+            keys, tfs = np.unique((codes << 20) | docs, return_counts=True)
+            # 百万级帖子的倒排表有上亿条，中间结果也用最窄的类型
+            posting_chunks.append((keys >> 20, ((keys & ((1 << 20) - 1)) + offset).astype(np.int32),
+                                   np.minimum(tfs, 65535).astype(np.uint16)))
+            id_chunks.append(np.asarray(post_ids, dtype=np.int64))
+            length_chunks.append(np.minimum(np.bincount(docs, minlength=len(texts)), 65535).astype(np.uint16))
+            offset += len(texts)
+        if not posting_chunks:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, np.zeros(0, dtype=np.uint16), empty, np.zeros(1, dtype=np.int64),
+                       np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16))
+        codes = np.concatenate([chunk[0] for chunk in posting_chunks])
+        order = np.argsort(codes, kind="stable")  # 各批按文档顺序拼接，稳定排序后每个词内文档仍升序
+        codes = codes[order]
+        docs = np.concatenate([chunk[1] for chunk in posting_chunks])[order]
+        tfs = np.concatenate([chunk[2] for chunk in posting_chunks])[order]
+        del order, posting_chunks
+        starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+        indptr = np.append(starts, len(codes)).astype(np.int64)
+        return cls(np.concatenate(id_chunks), np.concatenate(length_chunks), codes[starts], indptr, docs, tfs)
+
+    def postings(self, code: int):
+        i = int(np.searchsorted(self.vocab, code))
+        if i == len(self.vocab) or self.vocab[i] != code:
+            return self.docs[:0], self.tfs[:0]
+        return self.docs[self.indptr[i]:self.indptr[i + 1]], self.tfs[self.indptr[i]:self.indptr[i + 1]]
+
+    def nbytes(self):
+        return int(sum(array.nbytes for array in (self.post_ids, self.lengths, self.vocab, self.indptr, self.docs,
+                                                   self.tfs)))
+
+
+class _Delta:
+    """加载之后新增的帖子，按词记录倒排表，读时接在基础索引后面（文档下标从 base_size 开始）"""
+
+    def __init__(self, base_size: int):
+        self.base_size = base_size
+        self.post_ids = []
+        self.lengths = []
+        self.codes = []  # 每篇的词，重建时转入新的增量
+        self.postings = {}  # code -> ([doc], [tf])
+        self.seen = set()
+
+    def add(self, post_id: int, codes):
+        if post_id in self.seen:
+            return
+        self.seen.add(post_id)
+        doc = self.base_size + len(self.post_ids)
+        self.post_ids.append(post_id)
+        self.lengths.append(min(len(codes), 65535))
+        self.codes.append(codes)
+        for code, tf in zip(*np.unique(codes, return_counts=True)):
+            docs, tfs = self.postings.setdefault(int(code), ([], []))
+            docs.append(doc)
+            tfs.append(int(tf))
+
+
+class SearchIndex:
+    """帖子内容的进程内倒排索引，BM25 打分，多个词之间为 AND
+
+    全量从 posts 表加载；本进程发帖即时记入增量，其他 worker 的新帖按 Post.id 水位增量拉取，
+    增量过多或到达重建间隔时后台全量重建并替换。
+    """
+
+    def __init__(self, refresh_interval: float, rebuild_interval: float, compact_threshold: int,
+                 batch_size: int = 50000):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.compact_threshold = compact_threshold
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._index = _Index.build([])
+        self._delta = _Delta(0)
+        self._watermark = 0
+        self._loaded = False
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self._rebuilding = False
+        self._thread = None
+
+    def load_posts(self, batches):
+        """由 (post_ids, texts) 批次整体替换索引；增量中已包含在新索引里的帖子丢弃"""
+        index = _Index.build(batches)
+        max_id = int(index.post_ids[-1]) if len(index.post_ids) else 0
+        with self._lock:
+            delta = _Delta(len(index.post_ids))
+            for post_id, codes in zip(self._delta.post_ids, self._delta.codes):
+                if post_id > max_id:
+                    delta.add(post_id, codes)
+            self._index, self._delta = index, delta
+            self._watermark = max(self._watermark, max_id)
+            self._loaded = True
+            self._built_at = self._refreshed_at = time.monotonic()
+
+    def _add_locked(self, post_id: int, codes):
+        # 重建可能已经读到了这条帖子，不能重复计入
+        post_ids = self._index.post_ids
+        i = int(np.searchsorted(post_ids, post_id))
+        if i == len(post_ids) or post_ids[i] != post_id:
+            self._delta.add(post_id, codes)
+
+    def _load_from_db(self, db: Session):
+        started = time.monotonic()
+        result = db.execute(select(Post.id, Post.content).order_by(Post.id).execution_options(
+            yield_per=self.batch_size))
+
+        def batches():
+            for rows in result.partitions():
+                yield [row[0] for row in rows], [row[1] or "" for row in rows]
+
+        self.load_posts(batches())
+        logger.info("search index built: %d posts in %.2fs", len(self._index.post_ids), time.monotonic() - started)
+
+    def refresh(self, db: Session):
+        """首次调用全量加载；之后按间隔增量拉取其他 worker 的新帖，定期或增量过多时后台重建"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load_from_db(db)
+            return
+        now = time.monotonic()
+        if now - self._refreshed_at >= self.refresh_interval and self._load_lock.acquire(False):
+            try:
+                self._refreshed_at = now
+                rows = db.query(Post.id, Post.content).filter(Post.id > self._watermark).order_by(Post.id).all()
+                if rows:
+                    docs, codes = tokenize([row.content or "" for row in rows])
+                    order = np.argsort(docs, kind="stable")
+                    docs, codes = docs[order], codes[order]
+                    bounds = np.searchsorted(docs, np.arange(len(rows) + 1))
+                    with self._lock:
+                        for i, row in enumerate(rows):
+                            self._add_locked(row.id, codes[bounds[i]:bounds[i + 1]])
+                        self._watermark = rows[-1].id
+            finally:
+                self._load_lock.release()
+        if (now - self._built_at >= self.rebuild_interval or len(self._delta.post_ids) >= self.compact_threshold) \
+                and not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._background_load, name="search-rebuild", daemon=True).start()
+
+    def _background_load(self):
+        from utils.database import SessionLocal
+        db = SessionLocal()
+        try:
+            with self._load_lock:
+                self._load_from_db(db)
+        except Exception:
+            logger.exception("search index load failed")
+        finally:
+            db.close()
+            self._rebuilding = False
+
+    def start(self):
+        # 启动时在后台预加载，首个请求若先到会在 refresh 里等待加载完成
+        if self._thread is None and not self._loaded:
+            self._rebuilding = True
+            self._thread = threading.Thread(target=self._background_load, name="search-load", daemon=True)
+            self._thread.start()
+
+    def add_post(self, post_id: int, content: str):
+        _, codes = tokenize([content or ""])
+        with self._lock:
+            self._add_locked(post_id, codes)
+
+    def search(self, query: str, limit: int = 20, cursor=None, corpus=None):
+        """返回 ([(score, post_id)], corpus)，按分数降序、同分时 id 降序（新帖在前）
+
+        cursor 为上一页最后一条的 (score, id)。corpus 为首页查询时的语料统计
+        (最大帖子 id, 文档数, 平均长度, 各词的文档频率)，翻页时原样传回：后续页按同一份统计打分，
+        之后新增的帖子不参与，翻页期间有新帖也不会让结果重复或遗漏。
+        """
+        codes = np.unique(tokenize([query])[1])
+        if not len(codes):
+            return [], corpus
+        if corpus is not None and (len(corpus[3]) != len(codes) or corpus[1] <= 0 or corpus[2] <= 0):
+            raise ValueError("corpus does not match query")
+        with self._lock:
+            index, delta = self._index, self._delta
+            delta_postings = [delta.postings.get(int(code), ([], [])) for code in codes]
+            delta_postings = [(np.array(docs, dtype=np.int64), np.array(tfs)) for docs, tfs in delta_postings]
+            delta_ids = np.array(delta.post_ids, dtype=np.int64)
+            delta_lengths = np.array(delta.lengths, dtype=np.int64)
+        postings = []
+        for code, (extra_docs, extra_tfs) in zip(codes, delta_postings):
+            docs, tfs = index.postings(int(code))
+            postings.append((np.concatenate([docs, extra_docs]), np.concatenate([tfs, extra_tfs])))
+        if corpus is None:
+            size = len(index.post_ids) + len(delta_ids)
+            if not size:
+                return [], corpus
+            max_post_id = max(int(index.post_ids[-1]) if len(index.post_ids) else 0,
+                              int(delta_ids.max()) if len(delta_ids) else 0)
+            average_length = max((index.total_length + int(delta_lengths.sum())) / size, 1.0)
+            corpus = (max_post_id, size, average_length, tuple(len(docs) for docs, _ in postings))
+        max_post_id, size, average_length, frequencies = corpus
+        # 从最稀有的词开始求交集，之后每个词只在已有候选上二分查找；按快照里的文档频率排序，各页累加顺序一致
+        order = sorted(range(len(postings)), key=lambda i: frequencies[i])
+        candidates, scores = None, None
+        for i in order:
+            docs, tfs = postings[i]
+            if not len(docs):
+                return [], corpus
+            if candidates is None:
+                candidates, matched = docs, tfs
+            else:
+                positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                hit = docs[positions] == candidates
+                candidates, scores, matched = candidates[hit], scores[hit], tfs[positions[hit]]
+                if not len(candidates):
+                    return [], corpus
+            idf = np.log(1 + (size - frequencies[i] + 0.5) / (frequencies[i] + 0.5))
+            lengths = _lookup(index.lengths, delta_lengths, candidates)
+            tf = matched.astype(np.float64)
+            weight = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length))
+            scores = weight if scores is None else scores + weight
+        post_ids = _lookup(index.post_ids, delta_ids, candidates)
+        keep = post_ids <= max_post_id
+        if cursor is not None:
+            keep &= (scores < cursor[0]) | ((scores == cursor[0]) & (post_ids < cursor[1]))
+        scores, post_ids = scores[keep], post_ids[keep]
+        top = _top(scores, post_ids, limit)
+        return [(float(scores[i]), int(post_ids[i])) for i in top], corpus
+
+    def stats(self):
+        with self._lock:
+            index, delta = self._index, self._delta
+        return {
+            "loaded": self._loaded,
+            "posts": len(index.post_ids) + len(delta.post_ids),
+            "terms": len(index.vocab),
+            "postings": len(index.docs),
+            "pending_posts": len(delta.post_ids),
+            "watermark": self._watermark,
+            "index_bytes": index.nbytes(),
+        }
+
+
+def _top(scores, post_ids, limit: int):
+    """按 (score, post_id) 降序取前 limit 个的下标；先用分位数筛掉大部分候选，避免对全部结果排序"""
+    if len(scores) > limit * 4:
+        threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)
+        if len(tied) > limit - len(above):
+            # 同分的候选很多时只保留 id 最大的那部分
+            keep = limit - len(above)
+            tied = tied[np.argpartition(-post_ids[tied], keep - 1)[:keep]] if keep > 0 else tied[:0]
+        selected = np.concatenate([above, tied])
+    else:
+        selected = np.arange(len(scores))
+    return selected[np.lexsort((-post_ids[selected], -scores[selected]))][:limit]
+
+
+search_index = SearchIndex(settings.SEARCH_REFRESH_INTERVAL, settings.SEARCH_REBUILD_INTERVAL,
+                           settings.SEARCH_COMPACT_THRESHOLD)
@@ -0,0 +1,86 @@
+from sqlalchemy import insert, select, delete, update, literal, or_
+from sqlalchemy.orm import Session
+from models import User, Post, Follow, TimelineEntry
+from config import settings
+from utils.pagination import keyset_filter
+
+TIMELINE_COLUMNS = ["user_id", "post_id", "author_id", "created_at"]
+
+
+def is_celebrity(follower_count):
+    return (follower_count or 0) > settings.TIMELINE_CELEBRITY_THRESHOLD
+
+
+def pull_author_filter():
+    # 帖子不（全部）在收件箱里、需要读时合并的作者：当前是大V，或曾经是大V
+    return or_(User.follower_count > settings.TIMELINE_CELEBRITY_THRESHOLD, User.timeline_pull.is_(True))
+
+
+def celebrity_following_ids(db: Session, user_id: int):
+    # 当前用户关注的读时合并作者
+    return db.query(Follow.following_id).join(User, User.id == Follow.following_id).filter(
+        Follow.follower_id == user_id, pull_author_filter())
+
+
+def mark_pull_authors(bind):
+    """把当前的大V 标记为读时合并作者，用于给旧库补 timeline_pull 列和重建收件箱"""
+    with bind.begin() as conn:
+        conn.execute(update(User.__table__).where(
+            User.follower_count > settings.TIMELINE_CELEBRITY_THRESHOLD).values(timeline_pull=True))
+
+
+def fan_out_post(db: Session, post: Post):
+    """把新帖子写入作者所有粉丝的收件箱，需在同一事务内、post 已 flush 后调用"""
+    author = db.query(User.follower_count, User.timeline_pull).filter(User.id == post.user_id).first()
+    if author is not None and is_celebrity(author.follower_count):
+        if not author.timeline_pull:
+            db.query(User).filter(User.id == post.user_id).update({User.timeline_pull: True},
+                                                                  synchronize_session=False)
+        return
+    rows = select(Follow.follower_id, literal(post.id), literal(post.user_id), literal(post.created_at)).where(
+        Follow.following_id == post.user_id)
+    db.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, rows))
+
+
+def backfill_timeline(db: Session, user_id: int, following_ids):
+    """新关注时把被关注者最近的帖子回填进收件箱（读时合并的作者跳过）"""
+    authors = db.query(User.id).filter(User.id.in_(following_ids), ~pull_author_filter())
+    rows = select(literal(user_id), Post.id, Post.user_id, Post.created_at).where(
+        Post.user_id.in_(authors.scalar_subquery())).order_by(
+        Post.created_at.desc(), Post.id.desc()).limit(settings.TIMELINE_BACKFILL_LIMIT)
+    db.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, rows))
+
+
+def remove_from_timeline(db: Session, user_id: int, author_id: int):
+    db.execute(delete(TimelineEntry).where(TimelineEntry.user_id == user_id, TimelineEntry.author_id == author_id))
+
+
+def clear_timeline(db: Session, user_id: int):
+    db.execute(delete(TimelineEntry).where(TimelineEntry.user_id == user_id))
+
+
+def get_timeline_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10, cursor=None, columns=None):
+    window = skip + limit
+    entities = columns or (Post,)
+    inbox = db.query(*entities).join(TimelineEntry, TimelineEntry.post_id == Post.id).filter(
+        TimelineEntry.user_id == user_id)
+    celebrity_posts = db.query(*entities).filter(
+        Post.user_id.in_(celebrity_following_ids(db, user_id).scalar_subquery()))
+    if cursor is not None:
+        inbox = inbox.filter(keyset_filter((TimelineEntry.created_at, TimelineEntry.post_id), cursor))
+        celebrity_posts = celebrity_posts.filter(keyset_filter((Post.created_at, Post.id), cursor))
+    inbox = inbox.order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc()).limit(window).all()
+    celebrity_posts = celebrity_posts.order_by(Post.created_at.desc(), Post.id.desc()).limit(window).all()
+    # 读时合并的作者在成为大V 之前的帖子可能已在收件箱中，按 id 去重
+    merged = {post.id: post for post in inbox + celebrity_posts}
+    posts = sorted(merged.values(), key=lambda p: (p.created_at, p.id), reverse=True)
+    return posts[skip:skip + limit]
+
+
+def get_timeline_post_count(db: Session, user_id: int):
+    inbox_ids = db.query(TimelineEntry.post_id).filter(TimelineEntry.user_id == user_id)
+    inbox_count = inbox_ids.count()
+    celebrity_count = db.query(Post).filter(
+        Post.user_id.in_(celebrity_following_ids(db, user_id).scalar_subquery()),
+        Post.id.notin_(inbox_ids.scalar_subquery())).count()
+    return inbox_count + celebrity_count
@@ -0,0 +1,226 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, bindparam
+from models import PostScore
+from utils.database import engine
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+scores_table = PostScore.__table__
+EPOCH = datetime(1970, 1, 1)
+REBASE_EXPONENT = 300.0  # 距参考时刻的指数超过该值时换参考时刻，避免 exp 溢出
+
+
+def _timestamp(value: datetime):
+    return (value - EPOCH).total_seconds()
+
+
+class TrendingIndex:
+    """帖子热度：点赞、评论按时间指数衰减累加，进程内维护前 K 名
+
+    分数记在参考时刻 t0 的坐标里：权重 w、发生在 t 的事件记为 w·exp((t - t0)/tau)。所有帖子同比例衰减，
+    排名不随时间变化，事件到来时只加一次、不必逐个衰减；当前真实分数 = 记录值·exp(-(now - t0)/tau)。
+    各 worker 定时把本进程的增量合并进 post_scores 表（检查点），再读回表中合计值，
+    由此看到其他 worker 的事件；重启后从表里恢复，不用扫描历史点赞和评论。
+    """
+
+    def __init__(self, bind, half_life: float, top_k: int, min_score: float, checkpoint_interval: float):
+        self.bind = bind
+        self.tau = half_life / math.log(2)
+        self.top_k = top_k
+        self.min_score = min_score
+        self.checkpoint_interval = checkpoint_interval
+        self._t0 = time.time()
+        self._scores = {}  # post_id -> 参考坐标下的分数
+        self._pending = {}  # 上次检查点以来本进程的增量，参考坐标
+        self._heap = []  # 前 K 名的小顶堆 (score, post_id)，分数更新后旧条目留在堆里，出堆时跳过
+        self._top = {}  # 前 K 名 post_id -> 当前分数
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded = False
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+        self.last_checkpoint_duration = 0.0
+
+    def _decay(self, seconds: float):
+        return math.exp(-seconds / self.tau)
+
+    def add(self, post_id: int, weight: float, at: float = None):
+        """在写入提交之后调用"""
+        at = time.time() if at is None else at
+        with self._lock:
+            if (at - self._t0) / self.tau > REBASE_EXPONENT:
+                self._rebase(at)
+            value = weight / self._decay(at - self._t0)
+            self._pending[post_id] = self._pending.get(post_id, 0.0) + value
+            score = self._scores.get(post_id, 0.0) + value
+            self._scores[post_id] = score
+            self._bump(post_id, score)
+
+    def _bump(self, post_id: int, score: float):
+        # 分数只增不减，堆顶是前 K 名的门槛，门槛也只升不降，被挤出的帖子以后只有再涨分才可能回来
+        if post_id not in self._top and len(self._top) >= self.top_k:
+            self._clean()
+            if score <= self._heap[0][0]:
+                return
+            _, evicted = heapq.heappop(self._heap)
+            del self._top[evicted]
+        self._top[post_id] = score
+        heapq.heappush(self._heap, (score, post_id))
+        if len(self._heap) > 2 * self.top_k + 64:
+            self._rebuild_heap()
+
+    def _clean(self):
+        while self._top.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _rebuild_heap(self):
+        self._heap = [(score, post_id) for post_id, score in self._top.items()]
+        heapq.heapify(self._heap)
+
+    def _reset(self, scores, t0: float):
+        self._t0 = t0
+        self._scores = scores
+        self._top = dict(heapq.nlargest(self.top_k, scores.items(), key=lambda item: item[1]))
+        self._rebuild_heap()
+
+    def _rebase(self, t0: float):
+        factor = self._decay(t0 - self._t0)
+        self._pending = {post_id: value * factor for post_id, value in self._pending.items()}
+        self._reset({post_id: value * factor for post_id, value in self._scores.items()}, t0)
+
+    def top(self, limit: int):
+        """返回当前热度最高的 [(post_id, score)]，score 为衰减到此刻的分数"""
+        with self._lock:
+            factor = self._decay(time.time() - self._t0)
+            leaders = heapq.nlargest(limit, self._top.items(), key=lambda item: (item[1], item[0]))
+        return [(post_id, score * factor) for post_id, score in leaders]
+
+    def checkpoint(self):
+        """把本进程的增量合并进 post_scores，再用表中的合计值替换本进程的分数"""
+        with self._checkpoint_lock:
+            started = time.monotonic()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                t0 = self._t0
+            now = time.time()
+            stamp = EPOCH + timedelta(seconds=now)
+            try:
+                with self.bind.begin() as conn:
+                    if pending:
+                        self._merge(conn, pending, t0, now, stamp)
+                    # 只读还没衰减完的帖子；衰减完的从表里删除，表的大小只和近期活跃的帖子数有关。
+                    # 删除条件按当前行判断，其他 worker 刚合并过的行 expires_at 已经延后，不会被误删
+                    rows = conn.execute(select(scores_table).where(scores_table.c.expires_at > stamp)).all()
+                    conn.execute(delete(scores_table).where(scores_table.c.expires_at <= stamp))
+            except Exception:
+                self.checkpoint_errors += 1
+                with self._lock:
+                    factor = self._decay(self._t0 - t0)
+                    for post_id, value in pending.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0.0) + value * factor
+                raise
+            scores = {row.post_id: row.score * self._decay(now - _timestamp(row.updated_at)) for row in rows}
+            with self._lock:
+                # 检查点期间新到的增量叠加在表中的合计值之上
+                factor = self._decay(now - self._t0)
+                for post_id, value in self._pending.items():
+                    scores[post_id] = scores.get(post_id, 0.0) + value * factor
+                self._pending = {post_id: value * factor for post_id, value in self._pending.items()}
+                self._reset(scores, now)
+            self.loaded = True
+            self.checkpoints += 1
+            self.last_checkpoint_duration = time.monotonic() - started
+            return len(pending)
+
+    def expires_at(self, score: float, at: float):
+        """在 at 时刻为 score 的分数衰减到 min_score 的时刻"""
+        if self.min_score <= 0:
+            return datetime.max
+        seconds = self.tau * math.log(score / self.min_score) if score > self.min_score else 0.0
+        return EPOCH + timedelta(seconds=at + seconds)
+
+    def _merge(self, conn, pending, t0: float, now: float, stamp: datetime):
+        # 按 post_id 排序加锁，避免多个 worker 同时写检查点时互相死锁
+        post_ids = sorted(pending)
+        factor = self._decay(now - t0)
+        existing = {row.post_id: row for row in conn.execute(
+            select(scores_table).where(scores_table.c.post_id.in_(post_ids)).with_for_update())}
+        updates, inserts = [], []
+        for post_id in post_ids:
+            value = pending[post_id] * factor
+            row = existing.get(post_id)
+            if row is None:
+                inserts.append({"post_id": post_id, "score": value, "updated_at": stamp,
+                                "expires_at": self.expires_at(value, now)})
+            else:
+                value += row.score * self._decay(now - _timestamp(row.updated_at))
+                updates.append({"b_id": post_id, "b_score": value, "b_updated_at": stamp,
+                                "b_expires_at": self.expires_at(value, now)})
+        if inserts:
+            conn.execute(insert(scores_table), inserts)
+        if updates:
+            conn.execute(update(scores_table).where(scores_table.c.post_id == bindparam("b_id")).values(
+                score=bindparam("b_score"), updated_at=bindparam("b_updated_at"),
+                expires_at=bindparam("b_expires_at")), updates)
+
+    def _run(self):
+        # 启动后先读一次检查点预热，之后定时合并
+        while True:
+            try:
+                self.checkpoint()
+            except Exception:
+                logger.exception("trending checkpoint failed")
+            if self._stop.wait(self.checkpoint_interval):
+                break
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="trending-checkpoint", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.checkpoint()
+
+    def stats(self):
+        with self._lock:
+            tracked_posts = len(self._scores)
+            pending_posts = len(self._pending)
+            leaders = len(self._top)
+        return {
+            "loaded": self.loaded,
+            "tracked_posts": tracked_posts,
+            "top_posts": leaders,
+            "pending_posts": pending_posts,
+            "checkpoints": self.checkpoints,
+            "checkpoint_errors": self.checkpoint_errors,
+            "last_checkpoint_duration_seconds": self.last_checkpoint_duration,
+        }
+
+
+def fill_expires_at(bind, batch_size: int = 10000):
+    """给旧库补 post_scores.expires_at 列：按已有的分数和 updated_at 计算"""
+    with bind.begin() as conn:
+        rows = conn.execute(select(scores_table.c.post_id, scores_table.c.score, scores_table.c.updated_at).where(
+            scores_table.c.expires_at.is_(None))).all()
+        stmt = update(scores_table).where(scores_table.c.post_id == bindparam("b_id")).values(
+            expires_at=bindparam("b_expires_at"))
+        for start in range(0, len(rows), batch_size):
+            conn.execute(stmt, [{"b_id": row.post_id, "b_expires_at": trending.expires_at(
+                row.score, _timestamp(row.updated_at))} for row in rows[start:start + batch_size]])
+
+
+trending = TrendingIndex(engine, settings.TRENDING_HALF_LIFE, settings.TRENDING_TOP_K, settings.TRENDING_MIN_SCORE,
+                         settings.TRENDING_CHECKPOINT_INTERVAL)